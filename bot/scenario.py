@@ -0,0 +1,155 @@
+"""
+Open-loop load scenarios.
+
+A scenario is a mix of actions fired at a target arrival rate, defined in the bot config:
+
+    scenarios:
+      steady:
+        users: 20         # signed up and logged in before the scenario starts
+        rate: 10          # requests per second, once ramped up
+        ramp_up: 10       # seconds to ramp the rate up from zero, linearly
+        duration: 60      # seconds, ramp-up included
+        mix:              # relative weights of the actions
+          read_newsfeed: 70
+          post: 15
+          like: 10
+          unlike: 3
+          signup: 2
+
+Requests are fired on schedule whether or not the earlier ones got their responses, and latency is measured from the
+time a request was meant to be sent. A closed loop (waiting for a response before sending the next request) sends
+less when the server slows down, hiding exactly the latency spikes worth seeing.
+"""
+
+import asyncio
+import collections
+import itertools
+import math
+import random
+import time
+
+from bot.stats import PhaseStats
+
+# the actions a mix can be made of, see the bot command's run_scenario
+ACTIONS = ('read_newsfeed', 'post', 'like', 'unlike', 'signup')
+
+
+class Scenario:
+    # pylint: disable=too-few-public-methods,too-many-arguments
+
+    def __init__(self, name, rate, duration, mix, ramp_up=0, users=10):
+        if not rate > 0:
+            raise ValueError(f'The rate should be positive, got {rate!r}.')
+
+        unknown = [action for action in mix if action not in ACTIONS]
+
+        if unknown:
+            raise ValueError(f'Unknown actions {", ".join(unknown)} in the mix, expected some of {", ".join(ACTIONS)}.')
+
+        if not sum(mix.values()) > 0:
+            raise ValueError('The mix should weigh some of the actions.')
+
+        self.name = name
+        self.rate = rate
+        self.duration = duration
+        self.ramp_up = min(ramp_up, duration)
+        self.users = users
+
+        self.actions = list(mix.keys())
+        self.weights = list(itertools.accumulate(mix.values()))
+
+    @classmethod
+    def from_config(cls, name, config):
+        return cls(name, **config)
+
+    def arrival_time(self, arrivals):
+        """
+        The time by which `arrivals` requests are due: the inverse of the cumulative arrival count, which grows
+        quadratically during the linear ramp-up and linearly after it.
+        """
+        ramp_up_arrivals = self.rate * self.ramp_up / 2
+
+        if arrivals <= ramp_up_arrivals:
+            return math.sqrt(2 * self.ramp_up * arrivals / self.rate)
+
+        return self.ramp_up + (arrivals - ramp_up_arrivals) / self.rate
+
+    def arrivals(self, rng=random):
+        """
+        Yields `(time offset, action)` pairs of the scheduled requests. The arrivals are a Poisson process following
+        the ramped rate, so the requests come in at realistic, irregular intervals.
+        """
+        arrivals = 0.0
+
+        while True:
+            arrivals += rng.expovariate(1)
+            offset = self.arrival_time(arrivals)
+
+            if offset >= self.duration:
+                return
+
+            yield offset, self.pick_action(rng)
+
+    def pick_action(self, rng):
+        point = rng.random() * self.weights[-1]
+        return next(action for action, weight in zip(self.actions, self.weights) if point < weight)
+
+
+class OpenLoopScheduler:
+    """
+    Fires the scenario's actions on schedule. `actions` maps action names to coroutine functions, which return a
+    falsy value if the action failed, or `SKIPPED` if there was nothing to do (e.g. no likes to unlike).
+    """
+    SKIPPED = object()
+
+    def __init__(self, scenario, actions):
+        missing = [action for action in scenario.actions if action not in actions]
+
+        if missing:
+            raise ValueError(f'No coroutine for the actions {", ".join(missing)}.')
+
+        self.scenario = scenario
+        self.actions = actions
+        self.stats = collections.OrderedDict((action, PhaseStats()) for action in scenario.actions)
+
+    async def run(self):
+        tasks = set()
+        start = time.perf_counter()
+
+        for offset, action in self.scenario.arrivals():
+            intended = start + offset
+            delay = intended - time.perf_counter()
+
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            task = asyncio.ensure_future(self.fire(action, intended))
+            task.add_done_callback(tasks.discard)
+            tasks.add(task)
+
+        if tasks:
+            await asyncio.wait(tasks)
+
+        elapsed = time.perf_counter() - start
+
+        for stats in self.stats.values():
+            stats.elapsed = elapsed
+
+        return self.stats
+
+    async def fire(self, action, intended):
+        try:
+            result = await self.actions[action]()
+        except Exception:  # pylint: disable=broad-except
+            result = False
+
+        if result is self.SKIPPED:
+            return
+
+        # from the intended send time, so that any queueing on the way (connection pool, event loop) is included
+        latency = time.perf_counter() - intended
+
+        if result:
+            self.stats[action].record(latency)
+        else:
+            self.stats[action].fail(latency)
@@ -0,0 +1,73 @@
+"""
+Request counts and timings of the bot runs, per phase.
+"""
+
+import math
+import statistics
+
+
+class PhaseStats:
+    """
+    Latencies (in seconds) of the requests made in a phase, the number that failed, and the phase's wall time.
+    Plain attributes only, so the stats can be sent over from worker processes.
+    """
+
+    def __init__(self):
+        self.latencies = []
+        self.failures = 0
+        self.elapsed = 0.0
+
+    def record(self, latency):
+        self.latencies.append(latency)
+
+    def fail(self, latency):
+        self.record(latency)
+        self.failures += 1
+
+    @property
+    def requests(self):
+        return len(self.latencies)
+
+    def percentile(self, percent):
+        """
+        Nearest-rank percentile: the smallest latency that at least `percent` of the requests are within.
+        """
+        if not self.latencies:
+            return 0.0
+
+        ordered = sorted(self.latencies)
+        return ordered[max(0, math.ceil(len(ordered) * percent / 100) - 1)]
+
+    @classmethod
+    def merge(cls, stats, elapsed=None):
+        """
+        Combines the stats of the same phase from several workers. Workers run the phase concurrently, so unless the
+        overall wall time is known, the slowest worker's is taken.
+        """
+        merged = cls()
+
+        for worker_stats in stats:
+            merged.latencies.extend(worker_stats.latencies)
+            merged.failures += worker_stats.failures
+
+        merged.elapsed = elapsed if elapsed is not None else max((s.elapsed for s in stats), default=0.0)
+
+        return merged
+
+
+def format_report(phases):
+    """
+    Formats an ordered mapping of phase names to their stats as a table.
+    """
+    lines = [f'{"phase":<14}{"requests":>10}{"failures":>10}{"wall s":>10}{"req/s":>10}'
+             f'{"mean ms":>10}{"p50 ms":>10}{"p95 ms":>10}{"max ms":>10}']
+
+    for name, stats in phases.items():
+        mean = statistics.mean(stats.latencies) if stats.latencies else 0.0
+        throughput = stats.requests / stats.elapsed if stats.elapsed else 0.0
+
+        lines.append(f'{name:<14}{stats.requests:>10}{stats.failures:>10}{stats.elapsed:>10.2f}{throughput:>10.1f}'
+                     f'{mean * 1000:>10.1f}{stats.percentile(50) * 1000:>10.1f}{stats.percentile(95) * 1000:>10.1f}'
+                     f'{stats.percentile(100) * 1000:>10.1f}')
+
+    return '\n'.join(lines)
@@ -0,0 +1,269 @@
+"""
+Recording and replaying the bot's traffic.
+
+A recording is an append-only JSONL file, one request per line, written as the requests complete:
+
+    {"seq": 3, "at": 0.52, "after": 2, "phase": "post", "method": "POST", "path": "/api/v1/post/",
+     "headers": {"Authorization": "JWT <token>"}, "data": {...}, "status": 201,
+     "refs": ["<token>"], "produces": {"url": "/api/v1/post/5/", "like_action": "/api/v1/post/5/like/"}}
+
+`at` is the time the request was sent, in seconds since the recording started, and `after` the number of requests
+that had completed by then. Replay preserves that ordering: a request is only sent once the requests it came after are
+done, whatever the speed.
+
+Server assigned values (urls, tokens) are what ties the requests together: `produces` lists the ones a response
+introduced, and `refs` the earlier produced values a request uses. On replay, the values the new server hands out are
+substituted for the recorded ones.
+"""
+
+import asyncio
+import collections
+import heapq
+import itertools
+import json
+import time
+from urllib.parse import urlsplit
+
+from bot.stats import PhaseStats
+
+# response fields holding values later requests can refer to
+PRODUCED_FIELDS = ('url', 'like_action', 'token')
+
+
+def strip_host(value):
+    """
+    Urls are recorded without the scheme and host, so that the traffic can be replayed against a different one.
+    """
+    if isinstance(value, str) and value.startswith(('http://', 'https://')):
+        url = urlsplit(value)
+        return f'{url.path}?{url.query}' if url.query else url.path
+
+    return value
+
+
+def value_candidates(path, headers, data):
+    """
+    The values of a request that could have been handed out by the server.
+    """
+    yield path
+
+    for value in (headers or {}).values():
+        # e.g. 'JWT <token>'
+        yield from value.split(' ')
+
+    for value in (data or {}).values():
+        # e.g. the urls of a batch lookup
+        for item in value if isinstance(value, list) else [value]:
+            if isinstance(item, str):
+                yield strip_host(item)
+
+
+def rewrite(value, replacements):
+    """
+    Swaps the values (or list items) that are exactly one of the replaced ones, in one pass: a new value that happens
+    to be another's old one is left as it is.
+    """
+    if isinstance(value, list):
+        return [rewrite(item, replacements) for item in value]
+
+    if isinstance(value, str):
+        return replacements.get(strip_host(value), value)
+
+    return value
+
+
+class TrafficRecorder:
+    """
+    Writes the requests made to a JSONL recording, as they complete. An existing recording is replaced: the sequence
+    numbers and timings of a second run appended to it would clash with the first one's.
+    """
+
+    def __init__(self, path):
+        # line buffered, so an interrupted run still leaves every completed request on disk
+        self.file = open(path, 'w', buffering=1)
+        self.start = time.perf_counter()
+        self.seq = 0
+
+        # produced value -> sequence number of the request whose response produced it
+        self.producers = {}
+
+    @property
+    def completed(self):
+        """
+        The number of requests recorded so far; taken when a request is sent, it's the request's `after`.
+        """
+        return self.seq
+
+    def record(self, phase, sent_at, after, method, url, headers, data, status, body):
+        path = strip_host(url)
+        refs = [value for value in value_candidates(path, headers, data) if value in self.producers]
+
+        produces = {}
+
+        if isinstance(body, dict):
+            for field in PRODUCED_FIELDS:
+                value = strip_host(body.get(field, None))
+
+                if value is not None and value not in self.producers:
+                    self.producers[value] = self.seq
+                    produces[field] = value
+
+        record = {
+            'seq': self.seq,
+            'at': round(sent_at - self.start, 6),
+            'after': after,
+            'phase': phase,
+            'method': method,
+            'path': path,
+            'headers': headers,
+            'data': data,
+            'status': status,
+            'refs': refs,
+            'produces': produces,
+        }
+
+        # data built by the factories holds datetimes, sent as their string form anyway
+        self.file.write(json.dumps(record, default=str) + '\n')
+        self.seq += 1
+
+    def close(self):
+        self.file.close()
+
+
+class TrafficReplayer:
+    """
+    Replays a recording, streaming it from disk.
+
+    `speed` scales the recorded timing (2 replays twice as fast), 0 sends each request as soon as the requests it
+    came after are done. `send(method, url, headers, data)` is a coroutine returning the status and the parsed body.
+
+    Lines are in completion order, which lags the send order by at most the number of requests in flight. They're
+    read through a `window` sized heap to get them back in send order, so memory stays bounded by the window.
+    """
+
+    def __init__(self, send, hostname, speed=1.0, max_in_flight=100, window=1000):
+        self.send = send
+        self.hostname = hostname
+        self.speed = speed
+        self.max_in_flight = max_in_flight
+        self.window = window
+
+        self.stats = collections.OrderedDict()
+
+        # phase -> (first request sent, last request done)
+        self.spans = {}
+
+        # recorded value -> the value the server handed out for it on replay (None if its request failed)
+        self.produced = {}
+
+        # all the requests with a lower seq than the watermark are done
+        self.watermark = 0
+        self.done = set()
+        self.progress = None
+
+    def in_send_order(self, recording):
+        heap = []
+        # breaks the ties between requests sent at the same time
+        counter = itertools.count()
+
+        for line in recording:
+            record = json.loads(line)
+            heapq.heappush(heap, (record['at'], next(counter), record))
+
+            if len(heap) > self.window:
+                yield heapq.heappop(heap)[2]
+
+        while heap:
+            yield heapq.heappop(heap)[2]
+
+    async def replay(self, path):
+        # both bind to the running event loop
+        self.progress = asyncio.Condition()
+        in_flight = asyncio.Semaphore(self.max_in_flight)
+        tasks = set()
+        start = time.perf_counter()
+
+        with open(path, 'r') as recording:
+            for record in self.in_send_order(recording):
+                if self.speed:
+                    await asyncio.sleep(max(0, start + record['at'] / self.speed - time.perf_counter()))
+
+                await in_flight.acquire()
+
+                task = asyncio.ensure_future(self.replay_request(record))
+                task.add_done_callback(lambda task: in_flight.release())
+                task.add_done_callback(tasks.discard)
+                tasks.add(task)
+
+        if tasks:
+            await asyncio.wait(tasks)
+
+        for phase, (first, last) in self.spans.items():
+            self.stats[phase].elapsed = last - first
+
+        return self.stats
+
+    async def replay_request(self, record):
+        body = None
+
+        try:
+            async with self.progress:
+                await self.progress.wait_for(lambda: self.watermark >= record['after'])
+
+            body = await self.send_request(record)
+        finally:
+            # the values have to be in place before the requests waiting on this one go ahead
+            for field, old in record['produces'].items():
+                self.produced[old] = strip_host(body.get(field, None)) if isinstance(body, dict) else None
+
+            await self.complete(record['seq'])
+
+    async def send_request(self, record):
+        """
+        Send the recorded request with the replayed values substituted, returning the body if it succeeded.
+        """
+        stats = self.stats.setdefault(record['phase'], PhaseStats())
+
+        path, headers, data = record['path'], record['headers'], record['data']
+
+        replacements = {old: self.produced.get(old, old) for old in record['refs']}
+
+        # the request producing one failed, there's nothing sensible to send
+        if None in replacements.values():
+            stats.fail(0.0)
+            return None
+
+        # matched as value_candidates picked them out: the whole path, the header tokens and the data values
+        path = replacements.get(path, path)
+        headers = headers and {key: ' '.join(rewrite(token, replacements) for token in value.split(' '))
+                               for key, value in headers.items()}
+        data = data and {key: rewrite(value, replacements) for key, value in data.items()}
+
+        start = time.perf_counter()
+
+        try:
+            status, body = await self.send(record['method'], f'{self.hostname}{path}', headers, data)
+        except Exception:  # pylint: disable=broad-except
+            status, body = None, None
+
+        end = time.perf_counter()
+        first, last = self.spans.get(record['phase'], (start, end))
+        self.spans[record['phase']] = (min(first, start), max(last, end))
+
+        if status != record['status']:
+            stats.fail(end - start)
+            return None
+
+        stats.record(end - start)
+
+        return body
+
+    async def complete(self, seq):
+        async with self.progress:
+            self.done.add(seq)
+
+            while self.watermark in self.done:
+                self.done.remove(self.watermark)
+                self.watermark += 1
+
+            self.progress.notify_all()
@@ -3,3 +3,8 @@ from django.apps import AppConfig
 
 class SocialConfig(AppConfig):
     name = 'social'
+
+    def ready(self):
+        from social.object_cache import connect_signals
+
+        connect_signals()
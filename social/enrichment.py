@@ -0,0 +1,180 @@
+"""
+Profile enrichment through Clearbit.
+
+The clearbit client (and requests along with it) is only imported on the first lookup: bots never do one, and it
+keeps the import off the startup of every worker.
+
+Profiles whose lookup never happened (bots) or failed, and those looked up too long ago, are (re)enriched in bulk by
+`backfill()`, see `manage.py enrich`.
+"""
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from social.export import iterate_rows
+from social.models import UserProfile
+
+UPDATE_SQL = """
+UPDATE social_userprofile
+   SET enrichment_data = updates.data::jsonb,
+       company_name = updates.company_name,
+       company_domain = updates.company_domain,
+       role = updates.role,
+       enriched_at = %s
+  FROM unnest(%s::integer[], %s::text[], %s::text[], %s::text[], %s::text[])
+       AS updates(id, data, company_name, company_domain, role)
+ WHERE social_userprofile.id = updates.id
+"""
+
+
+class EnrichmentError(Exception):
+    pass
+
+
+def get_client():
+    import clearbit
+
+    clearbit.key = settings.CLEARBIT_API_KEY
+
+    return clearbit
+
+
+def find(email):
+    """
+    Returns the person and company data Clearbit has on the email, None if there's none. Raises EnrichmentError if
+    the lookup failed.
+    """
+    import requests
+
+    client = get_client()
+
+    try:
+        return client.Enrichment.find(email=email, stream=True)
+    except requests.RequestException as error:
+        raise EnrichmentError(str(error)) from error
+
+
+class RateLimiter:
+    """
+    Spaces calls, from any number of threads, at least 1 / `rate` seconds apart. No limit with a falsy rate.
+    """
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.lock = threading.Lock()
+        self.next_at = 0.0
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            at = max(now, self.next_at)
+            self.next_at = at + self.interval
+
+        time.sleep(at - now)
+
+
+class Checkpoint:
+    """
+    The id of the last profile of the last batch written back, so that an interrupted backfill can resume from there.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as checkpoint:
+                return json.load(checkpoint)['last_id']
+        except FileNotFoundError:
+            return 0
+
+    def save(self, last_id):
+        # replaced in one go, an interruption leaves either the previous checkpoint or this one
+        with open(f'{self.path}.tmp', 'w') as checkpoint:
+            json.dump({'last_id': last_id}, checkpoint)
+
+        os.replace(f'{self.path}.tmp', self.path)
+
+
+def get_candidates(refresh_after=None, after_id=0):
+    """
+    Profiles that were never enriched, or whose lookup failed; with `refresh_after` (a timedelta), also the ones
+    enriched longer ago than that, or at an unknown time.
+    """
+    candidates = Q(enrichment_data__isnull=True, enriched_at__isnull=True)
+
+    if refresh_after is not None:
+        candidates |= Q(enriched_at__lt=timezone.now() - refresh_after) | Q(enriched_at__isnull=True)
+
+    return (UserProfile.objects.filter(candidates, id__gt=after_id)
+            .order_by('id')
+            .values_list('id', 'user__email'))
+
+
+def write_back(results):
+    """
+    Writes a batch of `(profile id, enrichment data)` results in one statement, projected as UserProfile.save would.
+    """
+    profiles = [UserProfile(id=profile_id, enrichment_data=data) for profile_id, data in results]
+
+    for profile in profiles:
+        profile.project_enrichment_data()
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(UPDATE_SQL, [
+            timezone.now(),
+            [profile.id for profile in profiles],
+            [json.dumps(profile.enrichment_data) if profile.enrichment_data is not None else None
+             for profile in profiles],
+            [profile.company_name for profile in profiles],
+            [profile.company_domain for profile in profiles],
+            [profile.role for profile in profiles],
+        ])
+
+
+def backfill(candidates, lookup=find, concurrency=4, rate=None, batch_size=100, checkpoint=None):
+    """
+    Looks the candidate profiles (`(id, email)` rows, ordered by id) up, `concurrency` at a time and no faster than
+    `rate` a second, writing each batch back as it's done. Yields `(looked up, failed)` counts after each batch.
+
+    Failed lookups are left as they were, and picked up again by the next run; a resumed run starts after them.
+    """
+    limiter = RateLimiter(rate)
+
+    def look_up(row):
+        limiter.wait()
+
+        try:
+            return row['id'], lookup(row['user__email'])
+        except EnrichmentError:
+            return None
+
+    # the cursor outlives the commits of the batches written back meanwhile
+    rows = iterate_rows(candidates, chunk_size=batch_size, withhold=True)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while True:
+            batch = [row for _, row in zip(range(batch_size), rows)]
+
+            if not batch:
+                return
+
+            results = list(executor.map(look_up, batch))
+            succeeded = [result for result in results if result is not None]
+
+            if succeeded:
+                write_back(succeeded)
+
+            if checkpoint is not None:
+                checkpoint.save(batch[-1]['id'])
+
+            yield len(batch), len(batch) - len(succeeded)
@@ -0,0 +1,127 @@
+"""
+NDJSON exports of the social network tables.
+
+Rows are read through a postgres server-side (named) cursor, fetched `chunk_size` rows at a time, and encoded one line
+at a time, so the memory used by an export doesn't grow with the size of the table. Used by both the export api
+route and the `export` management command.
+"""
+
+import json
+import uuid
+import zlib
+
+from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, transaction
+from django.utils.dateparse import parse_datetime
+
+from social.models import Post, Like
+
+
+class Export:
+    """
+    Describes an exportable table: the model, the exported fields and the timestamp field usable as a watermark.
+    """
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, model, fields, timestamp_field=None):
+        self.model = model
+        self.fields = fields
+        self.timestamp_field = timestamp_field
+
+    def get_queryset(self, since_id=None, since=None):
+        queryset = self.model.objects.order_by('id')
+
+        if since_id is not None:
+            queryset = queryset.filter(id__gt=since_id)
+
+        if since is not None:
+            if self.timestamp_field is None:
+                raise ValueError(f'{self.model.__name__} has no timestamp to export since.')
+
+            queryset = queryset.filter(**{f'{self.timestamp_field}__gt': since})
+
+        return queryset.values_list(*self.fields)
+
+
+EXPORTS = {
+    'posts': Export(Post, ('id', 'created_at', 'author_id', 'title', 'text', 'like_count'), 'created_at'),
+    'likes': Export(Like, ('id', 'user_id', 'post_id')),
+    'users': Export(User, ('id', 'username', 'first_name', 'last_name', 'email', 'is_active', 'date_joined'),
+                    'date_joined'),
+}
+
+
+def parse_since(value):
+    """
+    Parses the `since` watermark, which is an ISO 8601 timestamp.
+    """
+    if value is None:
+        return None
+
+    since = parse_datetime(value)
+
+    if since is None:
+        raise ValueError(f"'{value}' is not a valid timestamp.")
+
+    return since
+
+
+def iterate_rows(queryset, chunk_size=2000, withhold=False):
+    """
+    Yields the rows of a `values_list` queryset as dictionaries, using a server-side cursor.
+
+    NOTE: Django (as of 1.10) buffers the whole result set on the client even with `iterator()`, hence the raw
+          psycopg2 named cursor. Named cursors only live within a transaction, so the iteration runs in one, unless
+          the cursor is declared `withhold`: it then outlives the commits of the transactions run while iterating
+          (e.g. writing back what's been read), at the cost of the server keeping the rest of the result around.
+    """
+    fields = queryset._fields  # pylint: disable=protected-access
+    sql, params = queryset.query.get_compiler(using=queryset.db).as_sql()
+    connection = connections[queryset.db]
+
+    def fetch():
+        connection.ensure_connection()
+
+        with connection.connection.cursor(name=f'export_{uuid.uuid4().hex}', withhold=withhold) as cursor:
+            cursor.itersize = chunk_size
+            cursor.execute(sql, params)
+
+            for row in cursor:
+                yield dict(zip(fields, row))
+
+    if withhold:
+        yield from fetch()
+    else:
+        with transaction.atomic(using=queryset.db):
+            yield from fetch()
+
+
+def ndjson(rows):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+
+
+def gzipped(lines):
+    """
+    Gzips the lines on the fly. Output is only emitted once the compressor has a block ready, so the consumer gets
+    reasonably sized chunks rather than one per line.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    for line in lines:
+        chunk = compressor.compress(line.encode())
+
+        if chunk:
+            yield chunk
+
+    yield compressor.flush()
+
+
+def export(name, since_id=None, since=None, compress=False, chunk_size=2000):
+    """
+    Returns a generator of NDJSON lines (or gzipped chunks of them) for the named export.
+    """
+    lines = ndjson(iterate_rows(EXPORTS[name].get_queryset(since_id, since), chunk_size))
+
+    return gzipped(lines) if compress else lines
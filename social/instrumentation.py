@@ -0,0 +1,85 @@
+"""
+Database query instrumentation.
+
+A backport of the `connection.execute_wrapper()` hook of later django versions (2.0+), which 1.10 lacks. Wrappers are
+called for every query run through the connection's cursors, with the same signature as upstream:
+
+    def wrapper(execute, sql, params, many, context):
+        return execute(sql, params, many, context)
+
+and installed for the duration of a block:
+
+    with execute_wrapper(connections['default'], wrapper):
+        ...
+
+Like the connections themselves, installed wrappers are per thread.
+"""
+
+import functools
+from contextlib import contextmanager
+
+
+class WrappedCursor:
+    """
+    Runs the cursor's queries through the connection's execute wrappers, delegating everything else.
+    """
+
+    def __init__(self, cursor, wrappers):
+        self.cursor = cursor
+        self.wrappers = wrappers
+
+    def __getattr__(self, attr):
+        return getattr(self.cursor, attr)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self.cursor.__exit__(exc_type, exc_value, traceback)
+
+    def execute(self, sql, params=None):
+        return self.run(sql, params, many=False)
+
+    def executemany(self, sql, param_list):
+        return self.run(sql, param_list, many=True)
+
+    def run(self, sql, params, many):
+        def execute(sql, params, many, context):
+            # pylint: disable=unused-argument
+            if many:
+                return self.cursor.executemany(sql, params)
+
+            return self.cursor.execute(sql, params)
+
+        # the first installed wrapper is the outermost, as upstream
+        for wrapper in reversed(self.wrappers):
+            execute = functools.partial(wrapper, execute)
+
+        return execute(sql, params, many, {'connection': self.cursor.db, 'cursor': self})
+
+
+@contextmanager
+def execute_wrapper(connection, wrapper):
+    """
+    Installs the wrapper on the connection for the duration of the block. Takes the actual connection, e.g.
+    `connections['default']`, not the `django.db.connection` proxy.
+    """
+    if 'execute_wrappers' not in connection.__dict__:
+        connection.execute_wrappers = []
+        make_cursor = connection.cursor
+
+        def cursor():
+            cursor = make_cursor()
+            return WrappedCursor(cursor, connection.execute_wrappers) if connection.execute_wrappers else cursor
+
+        connection.cursor = cursor
+
+    connection.execute_wrappers.append(wrapper)
+
+    try:
+        yield
+    finally:
+        connection.execute_wrappers.remove(wrapper)
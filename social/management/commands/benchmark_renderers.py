@@ -0,0 +1,78 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from social.factories import UserFactory, PostFactory
+from social.renderers import FastJSONRenderer, MessagePackRenderer
+from social.serializers import PostSerializer
+from social.views import PostViewSet
+
+
+class Command(BaseCommand):
+    help = 'Reports newsfeed page size on the wire and render time, in each of the api formats and encodings.'
+
+    formats = ('application/json', 'application/msgpack')
+    encodings = ('identity', 'gzip', 'br')
+
+    def add_arguments(self, parser):
+        parser.add_argument('-p', '--posts', required=False, default=100, type=int,
+                            help='Number of posts in the newsfeed.')
+        parser.add_argument('-i', '--iterations', required=False, default=20, type=int)
+
+    def measure(self, iterations, func):
+        """
+        Returns the result of the last call along with the median call time in milliseconds.
+        """
+        timings = []
+
+        for _ in range(iterations):
+            start = time.perf_counter()
+            result = func()
+            timings.append((time.perf_counter() - start) * 1000)
+
+        return result, statistics.median(timings)
+
+    def handle(self, *args, **options):
+        # the data is only there for the benchmark, roll it back once done
+        with transaction.atomic():
+            reader = UserFactory()
+            PostFactory.create_batch(options['posts'])
+
+            self.stdout.write(f'Newsfeed of {options["posts"]} posts, median of {options["iterations"]} runs\n\n')
+
+            self.report_requests(reader, options['iterations'])
+            self.report_renderers(reader, options['iterations'])
+
+            transaction.set_rollback(True)
+
+    def report_requests(self, reader, iterations):
+        client = APIClient(SERVER_NAME='localhost')
+        client.force_authenticate(reader)
+
+        self.stdout.write(f'{"format":<22}{"encoding":<10}{"bytes":>10}{"request ms":>12}')
+
+        for media_type in self.formats:
+            for encoding in self.encodings:
+                response, timing = self.measure(iterations, lambda: client.get(
+                    '/api/v1/post/newsfeed/', HTTP_ACCEPT=media_type, HTTP_ACCEPT_ENCODING=encoding))
+
+                self.stdout.write(f'{media_type:<22}{encoding:<10}{len(response.content):>10}{timing:>12.2f}')
+
+    def report_renderers(self, reader, iterations):
+        request = Request(APIRequestFactory().get('/api/v1/post/newsfeed/', SERVER_NAME='localhost'))
+        request.user = reader
+
+        view = PostViewSet(request=request, action='newsfeed', format_kwarg=None)
+        data = PostSerializer(view.get_queryset().exclude(author=reader), many=True, context={'request': request}).data
+
+        self.stdout.write(f'\n{"renderer":<22}{"bytes":>20}{"render ms":>12}')
+
+        for renderer in (JSONRenderer(), FastJSONRenderer(), MessagePackRenderer()):
+            content, timing = self.measure(iterations, lambda: renderer.render(data))
+
+            self.stdout.write(f'{type(renderer).__name__:<22}{len(content):>20}{timing:>12.2f}')
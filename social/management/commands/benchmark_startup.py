@@ -0,0 +1,66 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# run in a fresh interpreter, so that nothing is imported or connected yet
+WORKER = '''
+import json, os, sys, time
+
+start = time.perf_counter()
+from tradecore.wsgi import application
+loaded = time.perf_counter()
+
+from tradecore.warmup import request
+
+timings = {'load': loaded - start, 'modules': len(sys.modules)}
+
+for name in ('first', 'second'):
+    start = time.perf_counter()
+    timings['status'] = request(application, sys.argv[1])
+    timings[name] = time.perf_counter() - start
+
+print(json.dumps(timings))
+'''
+
+
+class Command(BaseCommand):
+    help = ('Reports how long a fresh worker takes to load the application and serve its first requests, with and '
+            'without warm-up.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('-r', '--runs', required=False, default=5, type=int,
+                            help='Number of fresh workers started for each setup.')
+        parser.add_argument('--path', required=False, default='/api/v1/post/?fields=url', type=str,
+                            help='Path requested by the workers.')
+
+    def start_worker(self, path, warm_up):
+        env = dict(os.environ, DJANGO_WARM_UP='true' if warm_up else 'false',
+                   DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'tradecore.settings'))
+
+        result = subprocess.run([sys.executable, '-c', WORKER, path], cwd=settings.BASE_DIR, env=env,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+
+        if result.returncode != 0:
+            raise CommandError(f'Worker failed:\n{result.stderr}')
+
+        return json.loads(result.stdout.splitlines()[-1])
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'GET {options["path"]}, median of {options["runs"]} fresh workers\n\n')
+        self.stdout.write(f'{"warm-up":<10}{"load ms":>10}{"first ms":>10}{"second ms":>11}{"modules":>9}'
+                          f'{"status":>8}')
+
+        for warm_up in (False, True):
+            runs = [self.start_worker(options['path'], warm_up) for _ in range(options['runs'])]
+
+            def median(key, runs=runs):
+                return statistics.median(run[key] for run in runs)
+
+            self.stdout.write(f'{"on" if warm_up else "off":<10}{median("load") * 1000:>10.1f}'
+                              f'{median("first") * 1000:>10.1f}{median("second") * 1000:>11.1f}'
+                              f'{int(median("modules")):>9}{runs[-1]["status"][:3]:>8}')
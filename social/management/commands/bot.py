@@ -1,127 +1,240 @@
-import argparse
 import asyncio
-import itertools
+import collections
+import multiprocessing
 import random
+import threading
+import time
 
 import aiohttp
 import factory
+import factory.fuzzy
+import faker.generator
 import yaml
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
 from rest_framework import status
 
+from bot.scenario import OpenLoopScheduler, Scenario
+from bot.stats import PhaseStats, format_report
+from bot.traffic import TrafficRecorder, TrafficReplayer
+from bot.transport import WSGITransport
 from social.factories import UserFactory, PostFactory
 
+PHASES = ('signup', 'login', 'post', 'like')
+
+# posts resolved per batch request, the most the api takes
+BATCH_SIZE = 100
+
+# marks the requests that failed, so they can be told apart from requests that return nothing
+FAILED = object()
+
 
 class Command(BaseCommand):
     help = 'Executes a bot run according to the config.'
 
     def add_arguments(self, parser):
-        parser.add_argument('hostname', type=str)
+        parser.add_argument('hostname', type=str, nargs='?', default='http://localhost',
+                            help='Server to run against, can be left out when running in-process.')
         parser.add_argument('-c', '--config', required=False, default='config.yml', type=str)
+        parser.add_argument('-w', '--workers', required=False, default=1, type=int,
+                            help='Number of worker processes to shard the users across.')
+        parser.add_argument('--phase-timeout', required=False, default=600, type=float,
+                            help='Seconds to wait for all the workers to finish a phase before giving up.')
+        parser.add_argument('--record', required=False, default=None, type=str,
+                            help='Write the requests made to this JSONL file, to replay them later. Replaces the file.')
+        parser.add_argument('--replay', required=False, default=None, type=str,
+                            help='Replay the requests recorded in this JSONL file, instead of generating new ones.')
+        parser.add_argument('--speed', required=False, default=1.0, type=float,
+                            help='Replay speed, relative to the recorded timing. 0 replays as fast as possible.')
+        parser.add_argument('-s', '--scenario', required=False, default=None, type=str,
+                            help='Run the named open-loop scenario from the config, instead of the phases.')
+        parser.add_argument('--in-process', action='store_true', default=False,
+                            help='Call the WSGI application directly instead of going through a server.')
+        parser.add_argument('--threads', required=False, default=1, type=int,
+                            help='Number of threads serving the requests when running in-process.')
+
+    async def request(self, method, url, data=None, headers=None):
+        """
+        Make a request, returning the status and the parsed body. Recorded, if the run is being recorded.
+        """
+        sent_at = time.perf_counter()
+        after = self.recorder.completed if self.recorder is not None else None
+
+        if self.transport is not None:
+            response_status, body = await self.transport.request(method, url, data=data, headers=headers)
+        else:
+            async with self.session.request(method, url, data=data, headers=headers) as response:
+                # no content type check, deletes respond with no content at all
+                body = await response.json(content_type=None)
+                response_status = response.status
+
+        if self.recorder is not None:
+            self.recorder.record(self.phase, sent_at, after, method, url, headers, data, response_status, body)
+
+        return response_status, body
 
     async def signup(self, user):
         """
         Sign up a user.
         """
         with await self.conn_sem:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(f'{self.options["hostname"]}/api/v1/user/?bot=true', data=user) as response:
-                    data = await response.json()
-                    assert response.status == status.HTTP_201_CREATED, f"Response {data}."
+            response_status, data = await self.request('POST', f'{self.options["hostname"]}/api/v1/user/?bot=true',
+                                                       data=user)
+            assert response_status == status.HTTP_201_CREATED, f"Response {data}."
 
-                    # since the response's password is readonly, include it
-                    data['password'] = user['password']
+            # since the response's password is readonly, include it
+            data['password'] = user['password']
 
-                    return data
+            return data
 
     async def login(self, user):
         """
         Retrieve the token for the provided user.
         """
         with await self.conn_sem:
-            async with aiohttp.ClientSession() as session:
-                # NOTE: The aiohttp library provides post and get as context managers, and I have no preferred style for
-                #       writting multiline with statements. The choice of aiohttp over requests was solely to toy around
-                #       with asynchronous programming in python.
-                async with session.post(f'{self.options["hostname"]}/api/v1/login/',
-                                        data={
-                                            'username': user['username'],
-                                            'password': user['password']
-                                        }) as response:
-                    data = await response.json()
-                    assert response.status == status.HTTP_200_OK
-                    assert 'token' in data
-
-                    return {'instance': user, 'headers': {'Authorization': f'JWT {data["token"]}'}}
+            # NOTE: The choice of aiohttp over requests was solely to toy around with asynchronous programming in
+            #       python.
+            response_status, data = await self.request('POST', f'{self.options["hostname"]}/api/v1/login/',
+                                                       data={
+                                                           'username': user['username'],
+                                                           'password': user['password']
+                                                       })
+            assert response_status == status.HTTP_200_OK
+            assert 'token' in data
+
+            return {'instance': user, 'headers': {'Authorization': f'JWT {data["token"]}'}}
 
     async def post(self, user, post):
         """
         Post a random post on the behalf of a provided token.
         """
         with await self.conn_sem:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(f'{self.options["hostname"]}/api/v1/post/',
-                                        data=post,
-                                        headers=user['headers']) as response:
-                    data = await response.json()
-                    assert response.status == status.HTTP_201_CREATED, f'Returned status was {response.status}. Data {data}'
+            response_status, data = await self.request('POST', f'{self.options["hostname"]}/api/v1/post/',
+                                                       data=post,
+                                                       headers=user['headers'])
+            assert response_status == status.HTTP_201_CREATED, f'Returned status was {response_status}. Data {data}'
+
+            return data
 
-                    return data
+    async def get_unliked_authors(self):
+        """
+        Retrieve the authors with zero-like posts, following the pages of the listing.
+        """
+        authors = []
+        url = f'{self.options["hostname"]}/api/v1/post/unliked/'
 
-    async def get_posts_with_no_likes(self):
         with await self.conn_sem:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f'{self.options["hostname"]}/api/v1/post/?n_likes=0') as response:
-                    posts = await response.json()
-                    assert response.status == status.HTTP_200_OK
-                    return posts
+            while url is not None:
+                response_status, page = await self.request('GET', url)
+                assert response_status == status.HTTP_200_OK
+
+                authors.extend(page['results'])
+                url = page['next']
+
+        return authors
+
+    async def get_like_actions(self, post_urls):
+        """
+        Resolve the posts' like actions, a batch of posts per request.
+        """
+        like_actions = {}
 
-    async def like_post(self, user, post_url):
         with await self.conn_sem:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(post_url, headers=user['headers']) as response:
-                    post = await response.json()
-                    assert response.status == status.HTTP_200_OK
+            for start in range(0, len(post_urls), BATCH_SIZE):
+                urls = post_urls[start:start + BATCH_SIZE]
+                response_status, data = await self.request('POST',
+                                                           f'{self.options["hostname"]}/api/v1/post/batch/'
+                                                           f'?fields=like_action',
+                                                           data={'urls': urls})
+                assert response_status == status.HTTP_200_OK, f'Returned status was {response_status}. Data {data}'
 
-                async with session.post(post['like_action'], headers=user['headers']) as session:
-                    data = await response.json()
-                    assert response.status == status.HTTP_200_OK
+                # the results come in the order of the urls, without the missing ones
+                found = [url for url in urls if url not in data['missing']]
+                like_actions.update(zip(found, (post['like_action'] for post in data['results'])))
 
-    async def load_user(self, user):
+        return like_actions
+
+    async def like_post(self, user, like_action):
         with await self.conn_sem:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(user['user_url']) as response:
-                    data = await response.json()
-                    assert response.status == status.HTTP_200_OK
+            response_status, data = await self.request('POST', like_action, headers=user['headers'])
+            assert response_status == status.HTTP_201_CREATED, f'Returned status was {response_status}. Data {data}'
 
-                    user['instance'] = data
-                    return user
+            return data
 
-    async def main(self, loop):
-        # build users
+    async def timed(self, stats, coroutine):
+        """
+        Await a request, recording how long it took and whether it failed.
+        """
+        start = time.perf_counter()
+
+        try:
+            result = await coroutine
+        except (AssertionError, aiohttp.ClientError, ValueError):
+            stats.fail(time.perf_counter() - start)
+            return FAILED
+
+        stats.record(time.perf_counter() - start)
+
+        return result
+
+    async def run_phase(self, name, coroutines):
+        """
+        Run the requests of a phase concurrently, and wait for the other workers (if any) to finish the phase too.
+        Returns the results of the successful requests.
+        """
+        stats = self.stats[name] = PhaseStats()
+        start = time.perf_counter()
+        self.phase = name
+
+        results = await asyncio.gather(*[self.timed(stats, coroutine) for coroutine in coroutines])
 
+        stats.elapsed = time.perf_counter() - start
+        self.wait_for_workers()
+
+        return [result for result in results if result is not FAILED]
+
+    def wait_for_workers(self):
+        # NOTE: Blocks the event loop, but nothing else is scheduled on it between the phases anyway.
+        if self.barrier is not None:
+            self.barrier.wait()
+
+    def build_users(self, number_of_users):
         # NOTE: An experiment in style: using lambdas to make comprehensions with complex calls more readable.
         build_user = lambda: factory.build(dict, user_profile=None, FACTORY_CLASS=UserFactory)
-        users = [build_user() for _ in range(self.config['number_of_users'])]
+        return [build_user() for _ in range(number_of_users)]
+
+    def build_post(self):
+        # the author is the authenticated user, pop it from the result
+        post_dict = factory.build(dict, author=None, FACTORY_CLASS=PostFactory)
+        post_dict.pop('author')
+
+        return post_dict
+
+    async def main(self, number_of_users):
+        # build users
+        users = self.build_users(number_of_users)
+
+        # everyone starts with their users built, data generation isn't part of the measurements
+        self.wait_for_workers()
 
         # step 1: perform signup
         # NOTE: Even though I'd prefer a map here, since it clarifies the goal more appropriately in my opinion,
-        #       the community consensus seems to be that the list comprehensions are preferable. I do not 
+        #       the community consensus seems to be that the list comprehensions are preferable. I do not
         #       disagree with the particular style, so here goes
-        # NOTE: Again, for the sakes of readability, we're shadowing the function name, as 
+        # NOTE: Again, for the sakes of readability, we're shadowing the function name, as
         response_futures = [self.signup(user) for user in users]
 
         # NOTE: we're asigning to user so we'd efficiently get the urls
         #       (e.g. as they come, not by zipping/mapping later)
-        users = await asyncio.gather(*response_futures)
+        users = await self.run_phase('signup', response_futures)
 
         # ...
-        # robustness omitted for the sake of brevity
+        # robustness omitted for the sake of brevity; failed requests are counted and their users dropped
         # ...
 
         # step 1a: obtain login tokens
         login_futures = [self.login(user) for user in users]
-        users = await asyncio.gather(*login_futures)
+        users = await self.run_phase('login', login_futures)
 
         # step 2: post, and do it in parallel
         post_futures = []
@@ -131,13 +244,9 @@ class Command(BaseCommand):
             user['n_posts'] = n_posts
 
             for _ in range(n_posts):
-                # the author is the authenticated user, pop it from the result
-                post_dict = factory.build(dict, author=None, FACTORY_CLASS=PostFactory)
-                post_dict.pop('author')
-
-                post_futures.append(self.post(user, post_dict))
+                post_futures.append(self.post(user, self.build_post()))
 
-        await asyncio.gather(*post_futures)
+        await self.run_phase('post', post_futures)
 
         # step 3: like, simmer down, do it sequentialy
         # TODO: go nuclear and pre-calculate the like-path?
@@ -145,20 +254,24 @@ class Command(BaseCommand):
         # users with most posts like first
         users.sort(key=lambda user: user['n_posts'])
 
-        posts = await self.get_posts_with_no_likes()
-        target_users = [{'user_url': user_url, 'non_liked_post_urls': posts} for user_url, posts
-                        in itertools.groupby(posts, lambda post: post['author'])]
-
-        target_user_futures = [self.load_user(user) for user in target_users]
-        target_users = await asyncio.gather(*target_user_futures)
+        # a single listing gives both the authors eligible for likes and their zero-like posts
+        self.phase = 'plan'
+        target_users = [{'user_url': author['author'], 'non_liked_post_urls': author['posts']}
+                        for author in await self.get_unliked_authors()]
 
         # A naive rule engine is specified in the like_generator.
-        # NOTE: Handy property of the generator is that it will stop once StopIteration gets raised, which can be either
-        #       once we exhaust likes, or once the rule of no-users-left-unliked comes into effect.
-        like_futures = [self.like_post(**like_dict) for like_dict in self.like_generator(users, target_users)]
+        # NOTE: Handy property of the generator is that it will stop once it returns, which can be either once we
+        #       exhaust likes, or once the rule of no-users-left-unliked comes into effect.
+        likes = list(self.like_generator(users, target_users))
+
+        # one request per batch of posts, rather than one per like, to find out where to like them
+        like_actions = await self.get_like_actions(sorted({like['post_url'] for like in likes}))
+
+        like_futures = [self.like_post(like['user'], like_actions[like['post_url']])
+                        for like in likes if like['post_url'] in like_actions]
         # ^^^^^^^^^^
         # TODONE: went nuclear and essentially pre-calculated the like-path
-        await asyncio.gather(*like_futures)
+        await self.run_phase('like', like_futures)
 
     def like_generator(self, users, target_users):
         """
@@ -177,33 +290,273 @@ class Command(BaseCommand):
                 other_users = filter(lambda target_user: target_user['user_url'] != user['instance']['url'],
                                      target_users)
 
-                # will implicitly raise StopIterations if no users meeting criteria are found.
+                # stop if no users meeting criteria are found.
                 # this essentialy enforces the last rule, that if there are no posts with zero likes, the process stops
                 # the convoluted part: it checks that no _users_ with zero-like-posts exist
-                # TODO: abide to the zen of python, be more explicit
-                target_user = next(other_users)
+                target_user = next(other_users, None)
+
+                if target_user is None:
+                    return
 
-                # get an arbitrary post
-                post = random.choice(target_user['instance']['posts'])
+                # get an arbitrary post that hasn't been liked yet
+                post = random.choice(target_user['non_liked_post_urls'])
 
-                if post in target_user['non_liked_post_urls']:
-                    target_user['non_liked_post_urls'].remove(post)
+                target_user['non_liked_post_urls'].remove(post)
 
-                    if len(target_user['non_liked_post_urls']) == 0:
-                        target_users.remove(target_user)
+                if len(target_user['non_liked_post_urls']) == 0:
+                    target_users.remove(target_user)
 
                 yield {'user': user, 'post_url': post}
 
                 likes += 1
 
-    def handle(self, *args, **options):
-        self.options = options
+    async def read_newsfeed(self):
+        user = random.choice(self.population)
 
-        with open(options['config'], 'r') as f:
-            self.config = yaml.load(f)
+        response_status, posts = await self.request('GET',
+                                                    f'{self.options["hostname"]}/api/v1/post/newsfeed/?fields=like_action',
+                                                    headers=user['headers'])
+
+        if response_status != status.HTTP_200_OK:
+            return False
+
+        self.like_targets.extend(post['like_action'] for post in posts)
+        return True
+
+    async def post_random(self):
+        user = random.choice(self.population)
+
+        # the author is the authenticated user, pop it from the result
+        post_dict = factory.build(dict, author=None, FACTORY_CLASS=PostFactory)
+        post_dict.pop('author')
+
+        response_status, post = await self.request('POST', f'{self.options["hostname"]}/api/v1/post/',
+                                                   data=post_dict, headers=user['headers'])
+
+        if response_status != status.HTTP_201_CREATED:
+            return False
+
+        self.like_targets.append(post['like_action'])
+        return True
+
+    async def like_random(self):
+        if not self.like_targets:
+            return OpenLoopScheduler.SKIPPED
+
+        user = random.choice(self.population)
+
+        response_status, like = await self.request('POST', random.choice(self.like_targets), headers=user['headers'])
+
+        if response_status == status.HTTP_201_CREATED:
+            self.placed_likes.append((user, like['url']))
 
+        # with random targets, hitting an already liked post is to be expected
+        return response_status in (status.HTTP_201_CREATED, status.HTTP_409_CONFLICT)
+
+    async def unlike_random(self):
+        if not self.placed_likes:
+            return OpenLoopScheduler.SKIPPED
+
+        # swap with the last one, to pop an arbitrary like in constant time
+        index = random.randrange(len(self.placed_likes))
+        self.placed_likes[index], self.placed_likes[-1] = self.placed_likes[-1], self.placed_likes[index]
+        user, like_url = self.placed_likes.pop()
+
+        response_status, _ = await self.request('DELETE', like_url, headers=user['headers'])
+
+        return response_status == status.HTTP_204_NO_CONTENT
+
+    async def signup_random(self):
+        response_status, _ = await self.request('POST', f'{self.options["hostname"]}/api/v1/user/?bot=true',
+                                                data=self.build_users(1)[0])
+
+        return response_status == status.HTTP_201_CREATED
+
+    async def run_scenario(self, scenario):
+        """
+        Sign up and log in the scenario's users, have each post once so there's something to like, then fire the
+        scenario's actions on schedule.
+        """
+        users = await self.run_phase('signup', [self.signup(user) for user in self.build_users(scenario.users)])
+        self.population = await self.run_phase('login', [self.login(user) for user in users])
+
+        # bounded, only the recent posts are liked
+        self.like_targets = collections.deque(maxlen=1000)
+        self.placed_likes = []
+
+        posts = await self.run_phase('post', [self.post(user, self.build_post()) for user in self.population])
+        self.like_targets.extend(post['like_action'] for post in posts)
+
+        self.stdout.write(f'Setup\n{format_report(self.stats)}\n')
+
+        scheduler = OpenLoopScheduler(scenario, {
+            'read_newsfeed': self.read_newsfeed,
+            'post': self.post_random,
+            'like': self.like_random,
+            'unlike': self.unlike_random,
+            'signup': self.signup_random,
+        })
+
+        self.phase = scenario.name
+        stats = await scheduler.run()
+
+        self.stdout.write(f'Scenario {scenario.name}: {scenario.rate} req/s over {scenario.duration}s, '
+                          f'latency measured from the scheduled send time')
+
+        return stats
+
+    def run_loop(self, coroutine):
+        """
+        Run the coroutine on a fresh event loop, with the connection semaphore and http session it relies on.
+        """
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+
+        # the semaphore binds to the current event loop, create it only once the loop is set
         self.conn_sem = asyncio.Semaphore(20)
 
-        loop = asyncio.get_event_loop()
-        loop.run_until_complete(self.main(loop))
+        # created here rather than upfront, so that forked workers get threads of their own
+        self.transport = WSGITransport(threads=self.options['threads']) if self.options['in_process'] else None
+
+        async def run():
+            async with aiohttp.ClientSession() as self.session:
+                return await coroutine
+
+        try:
+            return loop.run_until_complete(run())
+        finally:
+            if self.transport is not None:
+                self.transport.close()
+
+            loop.close()
+
+    def run_replay(self, path):
+        """
+        Replay a recorded run, reporting the phases of the recording.
+        """
+        async def send(method, url, headers, data):
+            with await self.conn_sem:
+                return await self.request(method, url, data=data, headers=headers)
+
+        replayer = TrafficReplayer(send, self.options['hostname'], self.options['speed'])
 
+        return self.run_loop(replayer.replay(path))
+
+    def run_worker(self, number_of_users, barrier=None, results=None):
+        """
+        Run the bot for a shard of the users, on an event loop of its own.
+        With a barrier, the phases are kept in lockstep with the other workers, and the stats are put on `results`.
+        """
+        self.barrier = barrier
+        self.stats = collections.OrderedDict()
+
+        try:
+            self.run_loop(self.main(number_of_users))
+        except BaseException:
+            # don't leave the others waiting on a worker that's gone
+            if barrier is not None:
+                barrier.abort()
+            raise
+
+        if results is not None:
+            results.put(self.stats)
+
+        return self.stats
+
+    def run_distributed(self, workers):
+        """
+        Shard the users across worker processes, and keep the workers' phases in lockstep: each phase starts once all
+        the workers are done with the previous one. The phase wall times are measured here, across all the workers.
+        """
+        # forked workers inherit the django setup, and can run the bound run_worker
+        context = multiprocessing.get_context('fork')
+
+        # but they can't share the database connections (used when running in-process)
+        connections.close_all()
+        barrier = context.Barrier(workers + 1, timeout=self.options['phase_timeout'])
+        results = context.Queue()
+
+        number_of_users = self.config['number_of_users']
+        shards = [number_of_users // workers + (1 if index < number_of_users % workers else 0)
+                  for index in range(workers)]
+
+        processes = [context.Process(target=self.run_worker_process, args=(shard, barrier, results))
+                     for shard in shards]
+
+        for process in processes:
+            process.start()
+
+        elapsed = {}
+
+        try:
+            # users are built
+            barrier.wait()
+
+            for phase in PHASES:
+                start = time.perf_counter()
+                barrier.wait()
+                elapsed[phase] = time.perf_counter() - start
+        except threading.BrokenBarrierError:
+            for process in processes:
+                process.terminate()
+
+            raise CommandError('A worker failed or timed out, aborting the run.')
+
+        worker_stats = [results.get() for _ in processes]
+
+        for process in processes:
+            process.join()
+
+        return collections.OrderedDict((phase, PhaseStats.merge([stats[phase] for stats in worker_stats],
+                                                                elapsed[phase]))
+                                       for phase in PHASES)
+
+    def run_worker_process(self, number_of_users, barrier, results):
+        # forked workers inherit the parent's random state, reseed so they don't all generate the same users
+        random.seed()
+        faker.generator.random.seed()
+        factory.fuzzy.reseed_random(None)
+
+        self.run_worker(number_of_users, barrier, results)
+
+    def handle(self, *args, **options):
+        self.options = options
+
+        with open(options['config'], 'r') as f:
+            self.config = yaml.safe_load(f)
+
+        self.phase = None
+        self.recorder = None
+
+        if options['record'] is not None:
+            # the workers would interleave their sequence numbers and timings in the one file
+            if options['workers'] > 1:
+                raise CommandError('Recording is only supported with a single worker.')
+
+            self.recorder = TrafficRecorder(options['record'])
+
+        if options['scenario'] is not None and options['workers'] > 1:
+            raise CommandError('Scenarios are only supported with a single worker.')
+
+        try:
+            if options['replay'] is not None:
+                stats = self.run_replay(options['replay'])
+            elif options['scenario'] is not None:
+                self.barrier = None
+                self.stats = collections.OrderedDict()
+
+                try:
+                    scenario = Scenario.from_config(options['scenario'], self.config['scenarios'][options['scenario']])
+                except (KeyError, TypeError, ValueError) as error:
+                    raise CommandError(f'Scenario {options["scenario"]} is missing or misconfigured: {error!r}')
+
+                stats = self.run_loop(self.run_scenario(scenario))
+            elif options['workers'] > 1:
+                stats = self.run_distributed(options['workers'])
+            else:
+                stats = self.run_worker(self.config['number_of_users'])
+        finally:
+            if self.recorder is not None:
+                self.recorder.close()
+
+        self.stdout.write(format_report(stats))
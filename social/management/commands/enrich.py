@@ -0,0 +1,39 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from social import enrichment
+
+
+class Command(BaseCommand):
+    help = ('Enriches the profiles that never were (e.g. bots) or whose lookup failed, and optionally refreshes stale '
+            'ones, through Clearbit.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--refresh-days', required=False, default=None, type=int,
+                            help='Also look up again the profiles enriched more than this many days ago.')
+        parser.add_argument('-c', '--concurrency', required=False, default=4, type=int,
+                            help='Number of lookups in flight at once.')
+        parser.add_argument('--rate', required=False, default=5.0, type=float,
+                            help='Maximum number of lookups per second, 0 for no limit.')
+        parser.add_argument('--batch-size', required=False, default=100, type=int,
+                            help='Number of profiles written back at a time.')
+        parser.add_argument('--checkpoint', required=False, default=None, type=str,
+                            help='File the progress is saved to after each batch.')
+        parser.add_argument('--resume', action='store_true', default=False,
+                            help='Start after the last profile saved to the checkpoint.')
+
+    def handle(self, *args, **options):
+        checkpoint = enrichment.Checkpoint(options['checkpoint']) if options['checkpoint'] else None
+        after_id = checkpoint.load() if checkpoint is not None and options['resume'] else 0
+        refresh_after = timedelta(days=options['refresh_days']) if options['refresh_days'] is not None else None
+
+        candidates = enrichment.get_candidates(refresh_after, after_id)
+        looked_up, failed = 0, 0
+
+        for batch, batch_failed in enrichment.backfill(candidates, concurrency=options['concurrency'],
+                                                       rate=options['rate'], batch_size=options['batch_size'],
+                                                       checkpoint=checkpoint):
+            looked_up += batch
+            failed += batch_failed
+            self.stdout.write(f'{looked_up} profiles looked up, {failed} failed')
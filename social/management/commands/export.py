@@ -0,0 +1,40 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from social import export
+
+
+class Command(BaseCommand):
+    help = 'Exports posts, likes or users as newline delimited JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=sorted(export.EXPORTS))
+        parser.add_argument('-o', '--output', required=False, default=None, type=str,
+                            help='File to write to, defaults to standard output.')
+        parser.add_argument('--since-id', required=False, default=None, type=int,
+                            help='Export only rows with an id greater than this one.')
+        parser.add_argument('--since', required=False, default=None, type=str,
+                            help='Export only rows created after this ISO 8601 timestamp (posts and users).')
+        parser.add_argument('--gzip', action='store_true', default=False)
+        parser.add_argument('--chunk-size', required=False, default=2000, type=int,
+                            help='Number of rows fetched from the database at a time.')
+
+    def handle(self, *args, **options):
+        try:
+            since = export.parse_since(options['since'])
+            export.EXPORTS[options['name']].get_queryset(options['since_id'], since)
+        except ValueError as error:
+            raise CommandError(str(error))
+
+        chunks = export.export(options['name'], options['since_id'], since, options['gzip'], options['chunk_size'])
+
+        # gzipped chunks are bytes, plain lines are text
+        if options['output'] is not None:
+            with open(options['output'], 'wb' if options['gzip'] else 'w') as output:
+                output.writelines(chunks)
+        elif options['gzip']:
+            sys.stdout.buffer.writelines(chunks)
+        else:
+            for line in chunks:
+                self.stdout.write(line, ending='')
@@ -0,0 +1,65 @@
+import io
+import pstats
+
+from django.core.management.base import BaseCommand, CommandError
+
+from social.profiling import ProfileStore
+
+
+class Command(BaseCommand):
+    help = 'Lists the captured request profiles, or summarizes one of them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('id', nargs='?', default=None, type=str,
+                            help='Capture to summarize, lists the captures if left out.')
+        parser.add_argument('--route', required=False, default=None, type=str,
+                            help='List only the captures of this route (e.g. post-newsfeed).')
+        parser.add_argument('--sort', required=False, default='cumulative', type=str,
+                            choices=('cumulative', 'tottime', 'ncalls'))
+        parser.add_argument('--limit', required=False, default=25, type=int,
+                            help='Number of functions shown in the summary.')
+
+    def handle(self, *args, **options):
+        store = ProfileStore.from_config()
+
+        if options['id'] is None:
+            self.list(store, options['route'])
+        else:
+            self.summarize(store, options['id'], options['sort'], options['limit'])
+
+    def list(self, store, route):
+        self.stdout.write(f'{"id":<32} {"method":<7} {"status":>6} {"latency ms":>11} {"queries":>8}  '
+                          f'{"user":>6}  {"route":<24} path')
+
+        for metadata in store:
+            if route is not None and metadata['route'] != route:
+                continue
+
+            self.stdout.write(f'{metadata["id"]:<32} {metadata["method"]:<7} {metadata["status"]:>6} '
+                              f'{metadata["latency"] * 1000:>11.1f} {len(metadata["queries"]):>8}  '
+                              f'{metadata["user"] or "-":>6}  {metadata["route"] or "-":<24} {metadata["path"]}')
+
+    def summarize(self, store, capture_id, sort, limit):
+        try:
+            metadata = store.load(capture_id)
+        except KeyError:
+            raise CommandError(f'No capture {capture_id} in {store.directory}.')
+
+        queries = metadata['queries']
+        query_time = sum(query['duration'] for query in queries)
+
+        self.stdout.write(f'{metadata["method"]} {metadata["path"]} -> {metadata["status"]}')
+        self.stdout.write(f'route {metadata["route"]}, user {metadata["user"]}, captured at {metadata["captured_at"]}')
+        self.stdout.write(f'{metadata["latency"] * 1000:.1f} ms, of which {query_time * 1000:.1f} ms in '
+                          f'{len(queries)} queries')
+
+        output = io.StringIO()
+        stats = pstats.Stats(store.path(capture_id, 'prof'), stream=output)
+        stats.strip_dirs().sort_stats(sort).print_stats(limit)
+
+        self.stdout.write(output.getvalue())
+
+        self.stdout.write(f'{"start ms":>10}{"ms":>10}  query')
+
+        for query in queries:
+            self.stdout.write(f'{query["start"] * 1000:>10.1f}{query["duration"] * 1000:>10.1f}  {query["sql"]}')
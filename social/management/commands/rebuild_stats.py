@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from social import stats
+from social.object_cache import get_object_cache
+
+
+class Command(BaseCommand):
+    help = 'Recounts the per-user stats (posts, likes given and received) from the posts and likes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', required=False, default=1000, type=int,
+                            help='Number of profiles recounted per transaction.')
+
+    def handle(self, *args, **options):
+        total = 0
+
+        for rebuilt in stats.rebuild(options['batch_size']):
+            total += rebuilt
+            self.stdout.write(f'{total} stats rebuilt')
+
+        # the counts are updated in bulk, bypassing the version bumps
+        object_cache = get_object_cache()
+
+        if object_cache.enabled:
+            object_cache.cache.clear()
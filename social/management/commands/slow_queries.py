@@ -0,0 +1,56 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from social import slow_queries
+
+
+class Command(BaseCommand):
+    help = 'Sums up the slow query log by query fingerprint, or shows the details of one fingerprint.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('fingerprint', nargs='?', default=None, type=str,
+                            help='Fingerprint to show the routes and the last captured plan of.')
+        parser.add_argument('--sort', required=False, default='total', type=str, choices=('total', 'count', 'max'))
+        parser.add_argument('--limit', required=False, default=20, type=int)
+        parser.add_argument('--log', required=False, default=None, type=str,
+                            help='Log to read, defaults to the configured one.')
+
+    def handle(self, *args, **options):
+        path = options['log'] or slow_queries.get_config()['LOG']
+        queries = slow_queries.aggregate(slow_queries.read_log(path))
+
+        if options['fingerprint'] is None:
+            self.summarize(sorted(queries, key=lambda query: query[options['sort']], reverse=True)[:options['limit']])
+            return
+
+        try:
+            query = next(query for query in queries if query['fingerprint'] == options['fingerprint'])
+        except StopIteration:
+            raise CommandError(f'No query with the fingerprint {options["fingerprint"]} in {path}.')
+
+        self.show(query)
+
+    def summarize(self, queries):
+        self.stdout.write(f'{"fingerprint":<14}{"count":>8}{"total ms":>12}{"mean ms":>10}{"max ms":>10}  '
+                          f'{"route":<24} query')
+
+        for query in queries:
+            route = query['routes'].most_common(1)[0][0] or '-'
+
+            self.stdout.write(f'{query["fingerprint"]:<14}{query["count"]:>8}{query["total"] * 1000:>12.1f}'
+                              f'{query["mean"] * 1000:>10.1f}{query["max"] * 1000:>10.1f}  {route:<24} '
+                              f'{query["sql"][:120]}')
+
+    def show(self, query):
+        self.stdout.write(query['sql'])
+        self.stdout.write(f'{query["count"]} times, {query["total"] * 1000:.1f} ms in total, '
+                          f'{query["mean"] * 1000:.1f} ms on average, {query["max"] * 1000:.1f} ms at most')
+
+        for route, count in query['routes'].most_common():
+            self.stdout.write(f'{count:>8}  {route or "-"}')
+
+        if query['plan'] is None:
+            self.stdout.write('No plan captured.')
+        else:
+            self.stdout.write(json.dumps(query['plan'], indent=2))
@@ -0,0 +1,191 @@
+"""
+Response compression, request profiling and the slow query log.
+
+Compresses responses with brotli or gzip, whichever the client accepts (brotli preferred), once they are large enough
+for it to pay off. Configured through `COMPRESSION` in `settings.REST_FRAMEWORK`:
+
+    'COMPRESSION': {
+        'MIN_SIZE': 1024,           # bytes, smaller responses are sent as they are
+        'ENCODINGS': ('br', 'gzip'),  # in order of preference
+        'BROTLI_QUALITY': 4,
+    }
+
+Streaming responses are left alone, they handle their own compression (see social.export).
+
+Profiling is configured through `PROFILING`, see social.profiling, and the slow query log through `SLOW_QUERIES`, see
+social.slow_queries.
+"""
+
+import cProfile
+import hmac
+import random
+import re
+import time
+
+import brotli
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+
+from social import profiling, slow_queries
+from social.instrumentation import execute_wrapper
+
+DEFAULTS = {
+    'MIN_SIZE': 1024,
+    'ENCODINGS': ('br', 'gzip'),
+    'BROTLI_QUALITY': 4,
+}
+
+ACCEPT_ENCODING_RE = re.compile(r'\s*([^\s;,]+)\s*(?:;\s*q=([0-9.]+))?')
+
+
+def parse_quality(quality):
+    """
+    The weight of a q parameter, 1 when there's none; a malformed one (e.g. `q=.`) refuses the coding.
+    """
+    if not quality:
+        return 1.0
+
+    try:
+        return float(quality)
+    except ValueError:
+        return 0.0
+
+
+def accepted_encodings(header):
+    """
+    Returns the content codings listed in an Accept-Encoding header, without the refused ones (q=0).
+    """
+    return {encoding.lower() for encoding, quality in ACCEPT_ENCODING_RE.findall(header) if parse_quality(quality) > 0}
+
+
+class CompressionMiddleware:
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.config = dict(DEFAULTS, **getattr(settings, 'REST_FRAMEWORK', {}).get('COMPRESSION', {}))
+
+        self.compressors = {
+            'br': lambda content: brotli.compress(content, quality=self.config['BROTLI_QUALITY']),
+            'gzip': compress_string,
+        }
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+
+        if len(response.content) < self.config['MIN_SIZE']:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        encoding = next((encoding for encoding in self.config['ENCODINGS'] if encoding in accepted), None)
+
+        if encoding is None:
+            return response
+
+        compressed = self.compressors[encoding](response.content)
+
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+
+        # the compressed body is no longer byte for byte what a strong etag was computed for
+        if response.has_header('ETag'):
+            response['ETag'] = re.sub(r'^(W/)?"', 'W/"', response['ETag'])
+
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Profiles the requests carrying the profiling token, and a random sample of all of them, saving the captures to
+    the profile store. The capture id is sent back in the X-Profile-Id header.
+    """
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.config = profiling.get_config()
+
+        if not self.config['TOKEN'] and not self.config['SAMPLE_RATE']:
+            raise MiddlewareNotUsed()
+
+        self.store = profiling.ProfileStore.from_config(self.config)
+
+    def should_profile(self, request):
+        token = request.META.get(self.config['HEADER'], None)
+
+        if token is not None and self.config['TOKEN']:
+            return hmac.compare_digest(token.encode(), self.config['TOKEN'].encode())
+
+        return random.random() < self.config['SAMPLE_RATE']
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+
+        timeline = profiling.QueryTimeline()
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+
+        with execute_wrapper(connections['default'], timeline):
+            profile.enable()
+
+            try:
+                response = self.get_response(request)
+            finally:
+                profile.disable()
+
+        latency = time.perf_counter() - start
+
+        user = getattr(request, 'user', None)
+        resolver_match = getattr(request, 'resolver_match', None)
+
+        response['X-Profile-Id'] = self.store.save(profile, {
+            'method': request.method,
+            'path': request.get_full_path(),
+            'route': resolver_match.view_name if resolver_match else None,
+            # set by rest framework once it authenticated the request, token based authentication included
+            'user': user.pk if user is not None and user.is_authenticated else None,
+            'status': response.status_code,
+            'latency': round(latency, 6),
+            'queries': timeline.queries,
+        })
+
+        return response
+
+
+class SlowQueryMiddleware:
+    """
+    Logs the slow queries run while serving a request, see social.slow_queries.
+    """
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.config = slow_queries.get_config()
+
+        if self.config['THRESHOLD'] is None:
+            raise MiddlewareNotUsed()
+
+    def __call__(self, request):
+        # the url is resolved by the time the view runs its queries
+        log = slow_queries.SlowQueryLog.from_config(self.config, route=lambda: getattr(
+            getattr(request, 'resolver_match', None), 'view_name', None))
+
+        with execute_wrapper(connections['default'], log):
+            response = self.get_response(request)
+
+        log.flush(self.config['LOG'])
+
+        return response
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social', '0004_allow_null_enrichment_and_unique_likes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunSQL(
+            """
+            UPDATE social_post
+               SET like_count = counts.n
+              FROM (SELECT post_id, COUNT(*) AS n FROM social_like GROUP BY post_id) AS counts
+             WHERE social_post.id = counts.post_id
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        # Only the posts nobody has liked yet are indexed, so the index stays small as posts collect likes.
+        # Ordered by author to serve the grouped-by-author listing (PostViewSet.unliked) straight from the index.
+        migrations.RunSQL(
+            'CREATE INDEX social_post_unliked_by_author ON social_post (author_id, id) WHERE like_count = 0',
+            reverse_sql='DROP INDEX social_post_unliked_by_author',
+        ),
+    ]
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-19 16:48
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social', '0005_post_like_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='company_domain',
+            field=models.CharField(db_index=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='company_name',
+            field=models.CharField(db_index=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='role',
+            field=models.CharField(db_index=True, max_length=255, null=True),
+        ),
+        # Same projection as UserProfile.project_enrichment_data, for the profiles already stored
+        migrations.RunSQL(
+            """
+            UPDATE social_userprofile
+               SET company_name = COALESCE(enrichment_data #>> '{company,name}',
+                                           enrichment_data #>> '{person,employment,name}'),
+                   company_domain = lower(COALESCE(enrichment_data #>> '{company,domain}',
+                                                   enrichment_data #>> '{person,employment,domain}')),
+                   role = enrichment_data #>> '{person,employment,role}'
+             WHERE enrichment_data IS NOT NULL
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
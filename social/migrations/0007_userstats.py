@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social', '0006_userprofile_enrichment_projection'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user_profile', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='social.UserProfile')),
+                ('post_count', models.PositiveIntegerField(default=0)),
+                ('likes_given', models.PositiveIntegerField(default=0)),
+                ('likes_received', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunSQL(
+            """
+            INSERT INTO social_userstats (user_profile_id, post_count, likes_given, likes_received)
+            SELECT profile.id,
+                   (SELECT COUNT(*) FROM social_post WHERE social_post.author_id = profile.user_id),
+                   (SELECT COUNT(*) FROM social_like WHERE social_like.user_id = profile.user_id),
+                   (SELECT COUNT(*) FROM social_like JOIN social_post ON social_post.id = social_like.post_id
+                     WHERE social_post.author_id = profile.user_id)
+              FROM social_userprofile AS profile
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -13,6 +13,46 @@ from django.db import models
 class UserProfile(models.Model):
     user = models.OneToOneField(User, related_name='user_profile', on_delete=models.CASCADE)
     enrichment_data = JSONField(null=True)
+    # When the enrichment was last looked up, whether or not anything was found; null if it never was (bots) or the
+    # lookup failed. See `manage.py enrich`.
+    enriched_at = models.DateTimeField(null=True)
+
+    # Frequently queried enrichment attributes, projected out of enrichment_data on save so they can be indexed
+    # and filtered on without touching the JSON.
+    company_name = models.CharField(max_length=255, null=True, db_index=True)
+    company_domain = models.CharField(max_length=255, null=True, db_index=True)
+    role = models.CharField(max_length=255, null=True, db_index=True)
+
+    def project_enrichment_data(self):
+        data = self.enrichment_data or {}
+
+        # the company lookup can fail while the person's employment is still known, fall back to it
+        company = data.get('company') or {}
+        employment = (data.get('person') or {}).get('employment') or {}
+
+        self.company_name = company.get('name') or employment.get('name')
+        domain = company.get('domain') or employment.get('domain')
+        self.company_domain = domain.lower() if domain else None
+        self.role = employment.get('role')
+
+    def save(self, *args, **kwargs):
+        self.project_enrichment_data()
+
+        created = self.pk is None
+        super(UserProfile, self).save(*args, **kwargs)
+
+        if created:
+            UserStats.objects.create(user_profile=self)
+
+
+class UserStats(models.Model):
+    # Denormalized counts of the user's activity, so that profiles don't need to count over posts and likes.
+    # Kept up to date by the views creating and deleting posts, likes and users (see social.stats).
+    user_profile = models.OneToOneField(UserProfile, related_name='stats', primary_key=True, on_delete=models.CASCADE)
+
+    post_count = models.PositiveIntegerField(default=0)
+    likes_given = models.PositiveIntegerField(default=0)
+    likes_received = models.PositiveIntegerField(default=0)
 
 
 class Post(models.Model):
@@ -23,6 +63,10 @@ class Post(models.Model):
 
     author = models.ForeignKey(User, related_name='posts')
 
+    # Denormalized so that zero-like posts can be looked up through a partial index (see migration 0005).
+    # Kept up to date by the views creating and deleting likes.
+    like_count = models.PositiveIntegerField(default=0)
+
 
 class Like(models.Model):
     user = models.ForeignKey(User, related_name='likes')
@@ -0,0 +1,249 @@
+"""
+Read-through cache of object representations, for the detail views.
+
+Entries are keyed by model, pk and the object's version; changing an object bumps its version, so the stale entries
+are never read again and simply expire. Configured through `OBJECT_CACHE` in `settings.REST_FRAMEWORK`:
+
+    'OBJECT_CACHE': {
+        'CACHE': 'objects',     # cache alias, None turns the object cache off
+        'TIMEOUT': 300,         # seconds an entry is kept
+        'LOCK_TIMEOUT': 5,      # seconds the other workers wait on the one rebuilding a missing entry
+        'POLL_INTERVAL': 0.02,
+    }
+
+Only one worker rebuilds a missing entry: it takes a lock (an atomic `add` on the cache), the others poll for the
+entry until it's there, or until the lock times out and they build it themselves.
+
+Versions are bumped by signal handlers on the models the representations depend on (see `SocialConfig.ready`). A
+change is bumped right away and again on commit: in between, a reader rebuilding the entry still sees the previous
+data, which the second bump leaves behind.
+"""
+
+import collections
+import hashlib
+import time
+import uuid
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.http import Http404
+from rest_framework.generics import get_object_or_404
+from rest_framework.permissions import BasePermission
+from rest_framework.response import Response
+
+from social.models import Like, Post, UserProfile
+from social.serializers import requested_fields
+
+DEFAULTS = {
+    'CACHE': None,
+    'TIMEOUT': 300,
+    'LOCK_TIMEOUT': 5,
+    'POLL_INTERVAL': 0.02,
+}
+
+
+def get_config():
+    return dict(DEFAULTS, **getattr(settings, 'REST_FRAMEWORK', {}).get('OBJECT_CACHE', {}))
+
+
+def get_object_cache():
+    return ObjectCache.from_config()
+
+
+class ObjectCache:
+
+    def __init__(self, cache, timeout, lock_timeout, poll_interval):
+        self.cache = cache
+        self.timeout = timeout
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+
+    @classmethod
+    def from_config(cls, config=None):
+        config = config or get_config()
+        cache = caches[config['CACHE']] if config['CACHE'] else None
+
+        return cls(cache, config['TIMEOUT'], config['LOCK_TIMEOUT'], config['POLL_INTERVAL'])
+
+    @staticmethod
+    def version_key(model, pk):
+        return f'version:{model._meta.label_lower}:{pk}'
+
+    def version(self, model, pk):
+        key = self.version_key(model, pk)
+        version = self.cache.get(key, None)
+
+        if version is None:
+            # versions start out at the time, so that an evicted version can't bring back the entries of an old one
+            self.cache.add(key, int(time.time() * 1000), None)
+            version = self.cache.get(key, None)
+
+        return version
+
+    @property
+    def enabled(self):
+        return self.cache is not None
+
+    def bump(self, model, pk):
+        try:
+            self.cache.incr(self.version_key(model, pk))
+        except ValueError:
+            # not cached, no entries to leave behind either
+            pass
+
+    def bump_on_commit(self, model, pk):
+        if not self.enabled:
+            return
+
+        self.bump(model, pk)
+        transaction.on_commit(lambda: self.bump(model, pk))
+
+    def key(self, model, pk, variant):
+        variant = hashlib.sha1(variant.encode()).hexdigest()[:16]
+        return f'object:{model._meta.label_lower}:{pk}:{self.version(model, pk)}:{variant}'
+
+    def get_or_build(self, model, pk, variant, build):
+        """
+        Returns the cached representation of the object, calling `build` to make it if it's not cached. Different
+        representations of the same object (e.g. other fields or hosts) are told apart by `variant`.
+        """
+        if not self.enabled:
+            return build()
+
+        key = self.key(model, pk, variant)
+        data = self.cache.get(key, None)
+
+        if data is not None:
+            return data
+
+        lock = f'lock:{key}'
+        token = uuid.uuid4().hex
+
+        if not self.cache.add(lock, token, self.lock_timeout):
+            deadline = time.perf_counter() + self.lock_timeout
+
+            while time.perf_counter() < deadline:
+                time.sleep(self.poll_interval)
+                data = self.cache.get(key, None)
+
+                if data is not None:
+                    return data
+
+                # the lock was released without an entry, e.g. the object doesn't exist
+                if self.cache.get(lock, None) is None:
+                    break
+
+            return build()
+
+        try:
+            data = build()
+            self.cache.set(key, data, self.timeout)
+
+            return data
+        finally:
+            if self.cache.get(lock, None) == token:
+                self.cache.delete(lock)
+
+
+class CachedRetrieveMixin:
+    """
+    Serves `retrieve` out of the object cache. The `uncached_fields` are specific to the requesting user, they're
+    left out of the cached representation and filled in on every request.
+
+    Requests with query params other than the `cached_params` (e.g. a filter of the view's queryset) aren't served from
+    the cache, as the cached representation doesn't account for them. Object permissions are checked on cache hits
+    too, which costs a lookup of the object when the view has any.
+    """
+    uncached_fields = ()
+    cached_params = ('fields', 'omit', 'format')
+
+    def has_object_permissions(self):
+        return any(type(permission).has_object_permission is not BasePermission.has_object_permission
+                   for permission in self.get_permissions())
+
+    def retrieve(self, request, *args, **kwargs):
+        if any(param not in self.cached_params for param in request.query_params):
+            return super(CachedRetrieveMixin, self).retrieve(request, *args, **kwargs)
+
+        serializer_class = self.get_serializer_class()
+        context = self.get_serializer_context()
+        model = serializer_class.Meta.model
+        try:
+            # the signals bump the versions of instance.pk, e.g. a `/post/05/` entry would never be bumped
+            pk = model._meta.pk.to_python(self.kwargs[self.lookup_url_kwarg or self.lookup_field])
+        except ValidationError:
+            raise Http404
+
+        # a cache hit doesn't go through get_object(), which checks them on a miss
+        if self.has_object_permissions():
+            self.check_object_permissions(request, get_object_or_404(model._default_manager.all(), pk=pk))
+
+        fields = requested_fields(request, serializer_class.Meta.fields)
+        cached_fields = [field for field in fields if field not in self.uncached_fields]
+        uncached_fields = [field for field in fields if field in self.uncached_fields]
+
+        def build():
+            serializer = serializer_class(self.get_object(), context=dict(context, fields=cached_fields))
+            # a plain dict, the serializer's own one refers back to it
+            return dict(serializer.data)
+
+        # hyperlinks hold the host
+        variant = f'{request.build_absolute_uri("/")}:{",".join(cached_fields)}'
+        data = dict(get_object_cache().get_or_build(model, pk, variant, build))
+
+        if uncached_fields:
+            serializer = serializer_class(context=dict(context, fields=uncached_fields))
+            # method fields, all they need of the object is its pk
+            instance = model(pk=pk)
+
+            for name, field in serializer.fields.items():
+                data[name] = field.to_representation(field.get_attribute(instance))
+
+        # write only fields aren't in there
+        return Response(collections.OrderedDict((field, data[field]) for field in fields if field in data))
+
+
+def user_changed(sender, instance, **kwargs):
+    # pylint: disable=unused-argument
+    get_object_cache().bump_on_commit(User, instance.pk)
+
+
+def profile_changed(sender, instance, **kwargs):
+    # pylint: disable=unused-argument
+    get_object_cache().bump_on_commit(User, instance.user_id)
+
+
+def post_changed(sender, instance, **kwargs):
+    # pylint: disable=unused-argument
+    get_object_cache().bump_on_commit(Post, instance.pk)
+    # the author's posts and stats
+    get_object_cache().bump_on_commit(User, instance.author_id)
+
+
+def like_changed(sender, instance, **kwargs):
+    # pylint: disable=unused-argument
+    object_cache = get_object_cache()
+
+    if not object_cache.enabled:
+        return
+
+    object_cache.bump_on_commit(Post, instance.post_id)
+
+    # the stats of both the user and the post's author
+    object_cache.bump_on_commit(User, instance.user_id)
+    author_id = Post.objects.filter(pk=instance.post_id).values_list('author_id', flat=True).first()
+
+    if author_id is not None:
+        object_cache.bump_on_commit(User, author_id)
+
+
+def connect_signals():
+    for model, handler in ((User, user_changed), (UserProfile, profile_changed), (Post, post_changed),
+                           (Like, like_changed)):
+        post_save.connect(handler, sender=model, dispatch_uid=f'object_cache_{model._meta.label_lower}_save')
+        post_delete.connect(handler, sender=model, dispatch_uid=f'object_cache_{model._meta.label_lower}_delete')
+
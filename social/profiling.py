@@ -0,0 +1,137 @@
+"""
+Per-request profiles.
+
+Requests are profiled (see social.middleware.ProfilingMiddleware) when they carry the profiling token in a header, or
+at random at a sampled rate. Configured through `PROFILING` in `settings.REST_FRAMEWORK`:
+
+    'PROFILING': {
+        'HEADER': 'HTTP_X_PROFILE',    # request.META key of the header carrying the token
+        'TOKEN': None,                 # profiling on demand is off without one
+        'SAMPLE_RATE': 0.0,            # fraction of all requests profiled
+        'DIRECTORY': 'profiles',
+        'MAX_PROFILES': 100,           # oldest ones are dropped beyond that
+    }
+
+Each capture is a pair of files in the directory: `<id>.prof`, the cProfile stats (readable with pstats or snakeviz),
+and `<id>.json`, the request's metadata along with the timeline of the SQL queries it ran. Capture ids sort by time.
+"""
+
+import json
+import os
+import time
+import uuid
+from datetime import datetime
+
+from django.conf import settings
+
+DEFAULTS = {
+    'HEADER': 'HTTP_X_PROFILE',
+    'TOKEN': None,
+    'SAMPLE_RATE': 0.0,
+    'DIRECTORY': 'profiles',
+    'MAX_PROFILES': 100,
+}
+
+
+def get_config():
+    return dict(DEFAULTS, **getattr(settings, 'REST_FRAMEWORK', {}).get('PROFILING', {}))
+
+
+class QueryTimeline:
+    """
+    An execute wrapper (see social.instrumentation) noting when each query started, relative to the timeline's
+    start, and how long it took.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'sql': sql,
+                'many': many,
+                'start': round(start - self.start, 6),
+                'duration': round(time.perf_counter() - start, 6),
+            })
+
+
+class ProfileStore:
+    """
+    A ring buffer of captures on disk: saving one drops the oldest beyond `max_profiles`.
+    """
+
+    def __init__(self, directory, max_profiles):
+        self.directory = directory
+        self.max_profiles = max_profiles
+
+    @classmethod
+    def from_config(cls, config=None):
+        config = config or get_config()
+        return cls(config['DIRECTORY'], config['MAX_PROFILES'])
+
+    def path(self, capture_id, extension):
+        return os.path.join(self.directory, f'{capture_id}.{extension}')
+
+    def save(self, profile, metadata):
+        """
+        Writes the profile (a cProfile.Profile) and its metadata, returning the capture id.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+
+        now = datetime.utcnow()
+        capture_id = f'{now:%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:8]}'
+
+        profile.dump_stats(self.path(capture_id, 'prof'))
+
+        # the metadata goes last, a capture is only listed once it's complete
+        with open(self.path(capture_id, 'json'), 'w') as output:
+            json.dump(dict(metadata, id=capture_id, captured_at=now.isoformat() + 'Z'), output)
+
+        self.prune()
+
+        return capture_id
+
+    def ids(self):
+        """
+        Ids of the stored captures, oldest first.
+        """
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+
+        return sorted(name[:-len('.json')] for name in names if name.endswith('.json'))
+
+    def prune(self):
+        ids = self.ids()
+
+        for capture_id in ids[:max(0, len(ids) - self.max_profiles)]:
+            for extension in ('json', 'prof'):
+                try:
+                    os.remove(self.path(capture_id, extension))
+                except FileNotFoundError:
+                    # another worker pruned it meanwhile
+                    pass
+
+    def load(self, capture_id):
+        """
+        Returns the metadata of a capture, raising KeyError if there's no such capture.
+        """
+        try:
+            with open(self.path(capture_id, 'json'), 'r') as metadata:
+                return json.load(metadata)
+        except FileNotFoundError:
+            raise KeyError(capture_id)
+
+    def __iter__(self):
+        for capture_id in self.ids():
+            try:
+                yield self.load(capture_id)
+            except KeyError:
+                continue
@@ -1,17 +1,88 @@
 # pylint: disable=missing-docstring
 
+import collections
+
 from django.contrib.auth.models import User, AnonymousUser
 from django.contrib.auth.hashers import make_password
 from rest_framework import serializers
 from rest_framework.reverse import reverse
 
-from social.models import UserProfile, Post, Like
+from social.models import UserProfile, UserStats, Post, Like
+
+
+def requested_fields(request, field_names):
+    """
+    Returns the names out of `field_names` the client asked for, with `?fields=a,b` (only these) and/or
+    `?omit=a,b` (all but these). With neither, all of them are returned.
+    """
+    params = getattr(request, 'query_params', request.GET)
+
+    fields = params.get('fields', None)
+    omit = params.get('omit', None)
+
+    names = list(field_names)
+
+    if fields:
+        names = [name for name in names if name in fields.split(',')]
+
+    if omit:
+        names = [name for name in names if name not in omit.split(',')]
+
+    return names
+
+
+class SparseFieldsetMixin:
+    """
+    Drops the fields the client hasn't asked for (see `requested_fields`) before anything gets evaluated, so unrequested
+    method fields and relations cost nothing.
+
+    Only the output is sparse: on writes, the writable fields are all kept for the input, and left out of the response.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(SparseFieldsetMixin, self).__init__(*args, **kwargs)
+
+        request = self.context.get('request', None)
+        self.sparse_fields = None
+
+        # fields picked by the view itself (see social.object_cache), rather than by the client
+        if 'fields' in self.context:
+            keep = self.context['fields']
+        elif request is not None:
+            keep = requested_fields(request, self.fields.keys())
+        else:
+            return
+
+        # told apart by the data to validate rather than by the method, batch lookups are POSTed reads
+        writing = hasattr(self, 'initial_data')
+        self.sparse_fields = keep
+
+        for name, field in list(self.fields.items()):
+            if name not in keep and not (writing and not field.read_only):
+                self.fields.pop(name)
+
+    def to_representation(self, instance):
+        data = super(SparseFieldsetMixin, self).to_representation(instance)
+
+        if self.sparse_fields is None:
+            return data
+
+        return collections.OrderedDict((name, value) for name, value in data.items() if name in self.sparse_fields)
+
+
+class UserStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UserStats
+        fields = ('post_count', 'likes_given', 'likes_received',)
 
 
-class UserSerializer(serializers.HyperlinkedModelSerializer):
+class UserSerializer(SparseFieldsetMixin, serializers.HyperlinkedModelSerializer):
+    # null for users without a profile, e.g. created through the admin
+    stats = UserStatsSerializer(source='user_profile.stats', read_only=True)
+
     class Meta:
         model = User
-        fields = ('url', 'username', 'first_name', 'last_name', 'email', 'password', 'user_profile', 'posts',)
+        fields = ('url', 'username', 'first_name', 'last_name', 'email', 'password', 'user_profile', 'posts', 'stats',)
         read_only_fields = ('user_profile',)
         extra_kwargs = {'password': {'write_only': True}}
 
@@ -34,13 +105,22 @@ class UserSerializer(serializers.HyperlinkedModelSerializer):
         return super(UserSerializer, self).update(obj, validated_data)
 
 
-class UserProfileSerializer(serializers.HyperlinkedModelSerializer):
+class UserProfileSerializer(SparseFieldsetMixin, serializers.HyperlinkedModelSerializer):
+    stats = UserStatsSerializer(read_only=True)
+
     class Meta:
         model = UserProfile
         fields = '__all__'
+        read_only_fields = ('company_name', 'company_domain', 'role',)
 
 
-class PostSerializer(serializers.HyperlinkedModelSerializer):
+class UserProfileSummarySerializer(UserProfileSerializer):
+    class Meta(UserProfileSerializer.Meta):
+        fields = None
+        exclude = ('enrichment_data',)
+
+
+class PostSerializer(SparseFieldsetMixin, serializers.HyperlinkedModelSerializer):
     like_url = serializers.SerializerMethodField()
     like_action = serializers.SerializerMethodField()
     n_likes = serializers.IntegerField(read_only=True)
@@ -67,9 +147,14 @@ class PostSerializer(serializers.HyperlinkedModelSerializer):
         # TODO: make the control flow more pleasant
         if not isinstance(request.user, AnonymousUser):
             try:
-                like = obj.likes.get(user=request.user)
+                # the viewset prefetches the user's likes for whole pages of posts
+                if hasattr(obj, 'user_likes'):
+                    like = obj.user_likes[0]
+                else:
+                    like = obj.likes.get(user=request.user)
+
                 return reverse('like-detail', args=[like.id], request=request)
-            except Like.DoesNotExist:
+            except (Like.DoesNotExist, IndexError):
                 return None
         else:
             return None
@@ -80,7 +165,7 @@ class PostSerializer(serializers.HyperlinkedModelSerializer):
         return reverse('post-like', args=[obj.id], request=request)
 
 
-class LikeSerializer(serializers.HyperlinkedModelSerializer):
+class LikeSerializer(SparseFieldsetMixin, serializers.HyperlinkedModelSerializer):
     class Meta:
         model = Like
         fields = '__all__'
@@ -0,0 +1,188 @@
+"""
+Slow query log.
+
+Queries run while serving a request (see social.middleware.SlowQueryMiddleware) that take longer than a threshold are
+appended to a JSONL log, along with the route of the request. A sampled share of the slow SELECTs is explained, and
+the plan logged with them. Configured through `SLOW_QUERIES` in `settings.REST_FRAMEWORK`:
+
+    'SLOW_QUERIES': {
+        'THRESHOLD': 0.1,              # seconds, None turns the log off
+        'EXPLAIN_SAMPLE_RATE': 0.1,    # fraction of the slow SELECTs explained
+        'EXPLAIN_ANALYZE': False,      # run them again under EXPLAIN ANALYZE, for the actual timings and row counts
+        'LOG': 'slow_queries.jsonl',
+    }
+
+The explain runs on the request path: a plain EXPLAIN only plans the query, EXPLAIN ANALYZE executes it a second
+time, doubling the cost of the very queries that are slow. Statements taking row locks (`SELECT ... FOR UPDATE` and
+the like) are never explained.
+
+Entries are aggregated by fingerprint, the query with its literals and parameters stripped, so that the same query
+run with different arguments adds up (see `manage.py slow_queries`).
+"""
+
+import collections
+import hashlib
+import json
+import random
+import re
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+
+DEFAULTS = {
+    'THRESHOLD': None,
+    'EXPLAIN_SAMPLE_RATE': 0.1,
+    'EXPLAIN_ANALYZE': False,
+    'LOG': 'slow_queries.jsonl',
+}
+
+LOCKING_RE = re.compile(r'\bFOR\s+(?:NO\s+KEY\s+UPDATE|UPDATE|KEY\s+SHARE|SHARE)\b', re.IGNORECASE)
+
+# order matters: strings may hold anything, and the lists are only recognizable once their items are placeholders
+NORMALIZATIONS = (
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'%s'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(...)'),
+    (re.compile(r'\s+'), ' '),
+)
+
+
+def get_config():
+    return dict(DEFAULTS, **getattr(settings, 'REST_FRAMEWORK', {}).get('SLOW_QUERIES', {}))
+
+
+def normalize(sql):
+    for pattern, replacement in NORMALIZATIONS:
+        sql = pattern.sub(replacement, sql)
+
+    return sql.strip()
+
+
+def fingerprint(sql):
+    return hashlib.sha1(normalize(sql).encode()).hexdigest()[:12]
+
+
+def explain(connection, sql, params, analyze=False):
+    """
+    Explains the query, running it again with `analyze`, returning the plan, or None if that failed. It runs in a
+    savepoint, so that a failure (e.g. a statement timeout) doesn't break the request's transaction.
+    """
+    options = 'ANALYZE, BUFFERS, FORMAT JSON' if analyze else 'FORMAT JSON'
+
+    try:
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN ({options}) {sql}', params)
+            return cursor.fetchone()[0]
+    except DatabaseError:
+        return None
+
+
+class SlowQueryLog:
+    """
+    An execute wrapper (see social.instrumentation) collecting the queries slower than the threshold. `route` is
+    called to get the route of the query, once it's known to be slow.
+    """
+
+    def __init__(self, threshold, explain_sample_rate, route=lambda: None, explain_analyze=False):
+        self.threshold = threshold
+        self.explain_sample_rate = explain_sample_rate
+        self.explain_analyze = explain_analyze
+        self.route = route
+        self.entries = []
+        self.explaining = False
+
+    @classmethod
+    def from_config(cls, config=None, route=lambda: None):
+        config = config or get_config()
+        return cls(config['THRESHOLD'], config['EXPLAIN_SAMPLE_RATE'], route, config['EXPLAIN_ANALYZE'])
+
+    @staticmethod
+    def explainable(sql):
+        return sql.lstrip()[:6].upper() == 'SELECT' and not LOCKING_RE.search(sql)
+
+    def __call__(self, execute, sql, params, many, context):
+        if self.explaining:
+            return execute(sql, params, many, context)
+
+        start = time.perf_counter()
+        result = execute(sql, params, many, context)
+        duration = time.perf_counter() - start
+
+        if duration < self.threshold:
+            return result
+
+        plan = None
+
+        # only reads, analyzing runs the statement for real; and not the ones locking rows, that would lock them twice
+        if not many and self.explainable(sql) and random.random() < self.explain_sample_rate:
+            self.explaining = True
+
+            try:
+                plan = explain(context['connection'], sql, params, self.explain_analyze)
+            finally:
+                self.explaining = False
+
+        self.entries.append({
+            'fingerprint': fingerprint(sql),
+            'sql': sql,
+            'duration': round(duration, 6),
+            'route': self.route(),
+            'at': time.time(),
+            'plan': plan,
+        })
+
+        return result
+
+    def flush(self, path):
+        """
+        Appends the collected entries to the log.
+        """
+        if not self.entries:
+            return
+
+        with open(path, 'a') as log:
+            # one write, so that the lines of concurrent workers don't interleave
+            log.write(''.join(json.dumps(entry, default=str) + '\n' for entry in self.entries))
+
+        self.entries = []
+
+
+def read_log(path):
+    try:
+        with open(path, 'r') as log:
+            for line in log:
+                yield json.loads(line)
+    except FileNotFoundError:
+        return
+
+
+def aggregate(entries):
+    """
+    Sums up the log entries by fingerprint, returning them ordered by total time, slowest first. Each one keeps the
+    last plan captured for it.
+    """
+    queries = collections.OrderedDict()
+
+    for entry in entries:
+        query = queries.setdefault(entry['fingerprint'], {
+            'fingerprint': entry['fingerprint'],
+            'sql': normalize(entry['sql']),
+            'count': 0,
+            'total': 0.0,
+            'max': 0.0,
+            'routes': collections.Counter(),
+            'plan': None,
+        })
+
+        query['count'] += 1
+        query['total'] += entry['duration']
+        query['max'] = max(query['max'], entry['duration'])
+        query['routes'][entry['route']] += 1
+        query['plan'] = entry['plan'] or query['plan']
+
+    for query in queries.values():
+        query['mean'] = query['total'] / query['count']
+
+    return sorted(queries.values(), key=lambda query: query['total'], reverse=True)
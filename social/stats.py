@@ -0,0 +1,156 @@
+"""
+Maintenance of the denormalized counts: `Post.like_count`, and the per-user `UserStats`.
+
+The counts are adjusted in the same transaction as the change they follow. Single posts and likes are counted with
+F() updates. Deletions cascading over many rows (a post with its likes, a user with their posts and likes) are
+uncounted before the rows go, in one statement per count whatever the number of users involved.
+
+Counts can still drift, from rows written around the api (the admin, the factories, bulk writes) or removed before
+they were counted. Decrements stop at 0 rather than failing the request on the counts' check constraint, and
+`rebuild()` recomputes the user stats from scratch.
+"""
+
+import collections
+
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.db.models.functions import Greatest
+
+from social.models import Like, Post, UserStats
+
+# user stats are keyed by profile, the changes by user; the profile join is served by the unique user_id index
+SUBTRACT_SQL = """
+UPDATE social_userstats
+   SET {column} = GREATEST({column} - counts.n, 0)
+  FROM social_userprofile AS profile, unnest(%s::integer[], %s::integer[]) AS counts(user_id, n)
+ WHERE social_userstats.user_profile_id = profile.id AND profile.user_id = counts.user_id
+"""
+
+SUBTRACT_LIKES_SQL = """
+UPDATE social_post
+   SET like_count = GREATEST(like_count - counts.n, 0)
+  FROM unnest(%s::integer[], %s::integer[]) AS counts(post_id, n)
+ WHERE social_post.id = counts.post_id
+"""
+
+REBUILD_SQL = """
+UPDATE social_userstats
+   SET post_count = (SELECT COUNT(*) FROM social_post WHERE social_post.author_id = profile.user_id),
+       likes_given = (SELECT COUNT(*) FROM social_like WHERE social_like.user_id = profile.user_id),
+       likes_received = (SELECT COUNT(*) FROM social_like JOIN social_post ON social_post.id = social_like.post_id
+                          WHERE social_post.author_id = profile.user_id)
+  FROM social_userprofile AS profile
+ WHERE social_userstats.user_profile_id = profile.id
+   AND social_userstats.user_profile_id > %s AND social_userstats.user_profile_id <= %s
+"""
+
+# profiles created before the stats were, or whose stats were removed by hand
+MISSING_SQL = """
+INSERT INTO social_userstats (user_profile_id, post_count, likes_given, likes_received)
+SELECT profile.id, 0, 0, 0
+  FROM social_userprofile AS profile
+ WHERE NOT EXISTS (SELECT 1 FROM social_userstats WHERE social_userstats.user_profile_id = profile.id)
+"""
+
+
+def adjusted(field, delta):
+    """
+    The field's value adjusted by delta, down to 0 at the least.
+    """
+    return Greatest(F(field) + delta, 0)
+
+
+def user_stats(user_id):
+    return UserStats.objects.filter(user_profile__user_id=user_id)
+
+
+def count_posts(author_id, delta):
+    """
+    Follows posts written (delta > 0) or deleted by the author.
+    """
+    user_stats(author_id).update(post_count=adjusted('post_count', delta))
+
+
+def count_likes(post_id, user_id, delta):
+    """
+    Follows the likes the user placed on (delta > 0) or removed from the post, on the post and on both the user's and
+    the post author's stats.
+    """
+    if not delta:
+        return
+
+    Post.objects.filter(pk=post_id).update(like_count=adjusted('like_count', delta))
+
+    # two users liking each other's posts would otherwise take their stats in opposite orders, and deadlock; the
+    # rows are looked up first, locking over the joins would lock the post and the users along with them
+    stats_ids = list(UserStats.objects.filter(Q(user_profile__user_id=user_id) | Q(user_profile__user__posts=post_id))
+                     .values_list('pk', flat=True))
+    list(UserStats.objects.filter(pk__in=stats_ids).order_by('pk').select_for_update().values_list('pk', flat=True))
+
+    user_stats(user_id).update(likes_given=adjusted('likes_given', delta))
+    UserStats.objects.filter(user_profile__user__posts=post_id).update(likes_received=adjusted('likes_received', delta))
+
+
+def reassign_post(post, previous_author_id):
+    """
+    Moves the post, and the likes it got, over from the stats of its previous author.
+    """
+    count_posts(previous_author_id, -1)
+    count_posts(post.author_id, 1)
+
+    likes = Like.objects.filter(post=post).count()
+    user_stats(previous_author_id).update(likes_received=adjusted('likes_received', -likes))
+    user_stats(post.author_id).update(likes_received=adjusted('likes_received', likes))
+
+
+def subtract(sql, counts, **format_args):
+    if not counts:
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql.format(**format_args), [list(counts.keys()), list(counts.values())])
+
+
+def uncount_likes(likes):
+    """
+    Takes the likes of the queryset off the counts, ahead of deleting them.
+    """
+    likes = list(likes.values_list('post_id', 'user_id', 'post__author_id'))
+
+    subtract(SUBTRACT_LIKES_SQL, collections.Counter(post_id for post_id, _, _ in likes))
+    subtract(SUBTRACT_SQL, collections.Counter(user_id for _, user_id, _ in likes), column='likes_given')
+    subtract(SUBTRACT_SQL, collections.Counter(author_id for _, _, author_id in likes), column='likes_received')
+
+
+def uncount_posts(posts):
+    """
+    Takes the posts of the queryset, and the likes they got, off the counts, ahead of deleting them.
+    """
+    uncount_likes(Like.objects.filter(post__in=posts))
+    subtract(SUBTRACT_SQL, collections.Counter(posts.values_list('author_id', flat=True)), column='post_count')
+
+
+def uncount_user(user):
+    """
+    Takes the user's posts and likes off the counts, ahead of deleting the user. The user's own stats go along
+    with the profile.
+    """
+    uncount_posts(user.posts.all())
+    # the likes on the user's own posts are already off
+    uncount_likes(user.likes.exclude(post__author=user))
+
+
+def rebuild(batch_size=1000):
+    """
+    Recounts the user stats, a batch of profiles per transaction so that locks are held briefly. Yields the number
+    of stats rebuilt after each batch.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(MISSING_SQL)
+
+    last_id = UserStats.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+
+    for start in range(0, last_id, batch_size):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(REBUILD_SQL, [start, start + batch_size])
+            yield cursor.rowcount
@@ -4,6 +4,7 @@ Testing fixtures for the social app.
 
 import factory
 import pytest
+from django.core.cache import caches
 from rest_framework.test import APIClient, APIRequestFactory
 from rest_framework_jwt.settings import api_settings
 
@@ -57,8 +58,8 @@ def post_dict():
 
 @pytest.fixture
 def clearbit(mock):
-    mock.patch('social.views.clearbit.key')
-    enrichment_find_mock = mock.patch('social.views.clearbit.Enrichment.find')
+    mock.patch('clearbit.key')
+    enrichment_find_mock = mock.patch('clearbit.Enrichment.find')
     enrichment_find_mock.return_value = {}
 
     # NOTE: has to be a yield fixture, since mock is undone by the end of the function
@@ -89,3 +90,40 @@ def bogus_request():
     """
     factory = APIRequestFactory()
     return factory.get('/')
+
+
+@pytest.fixture(autouse=True)
+def throttle_cache():
+    """
+    Throttle buckets live in a process-wide cache; start every test with full buckets.
+    """
+    cache = caches['throttle']
+    cache.clear()
+
+    yield cache
+
+    cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def slow_query_log(settings, tmpdir):
+    """
+    Keeps the slow queries of the tests out of the configured log.
+    """
+    config = dict(settings.REST_FRAMEWORK['SLOW_QUERIES'], LOG=str(tmpdir.join('slow_queries.jsonl')))
+    settings.REST_FRAMEWORK = dict(settings.REST_FRAMEWORK, SLOW_QUERIES=config)
+
+    return config['LOG']
+
+
+@pytest.fixture(autouse=True)
+def object_cache():
+    """
+    Cached objects outlive the test database rows they were made of; start every test with an empty cache.
+    """
+    cache = caches['objects']
+    cache.clear()
+
+    yield cache
+
+    cache.clear()
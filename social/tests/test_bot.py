@@ -0,0 +1,231 @@
+import asyncio
+import collections
+import io
+import json
+import random
+import threading
+
+import pytest
+from django.core.management import call_command
+
+from bot.scenario import Scenario
+from bot.stats import PhaseStats, format_report
+from bot.traffic import TrafficRecorder, TrafficReplayer
+from bot.transport import WSGITransport
+from social.models import Like
+
+
+@pytest.mark.unit
+def test_merge_worker_stats():
+    # pylint: disable=missing-docstring
+    first, second = PhaseStats(), PhaseStats()
+    first.record(0.1)
+    first.elapsed = 1.0
+    second.record(0.2)
+    second.fail(0.3)
+    second.elapsed = 2.0
+
+    merged = PhaseStats.merge([first, second])
+
+    assert (merged.requests, merged.failures, merged.elapsed) == (3, 1, 2.0)
+    assert PhaseStats.merge([first, second], elapsed=2.5).elapsed == 2.5
+
+
+@pytest.mark.unit
+def test_percentiles():
+    # pylint: disable=missing-docstring
+    stats = PhaseStats()
+
+    for latency in range(1, 101):
+        stats.record(latency / 1000)
+
+    assert stats.percentile(50) == 0.05
+    assert stats.percentile(99) == 0.099
+    assert stats.percentile(100) == 0.1
+    assert stats.percentile(0) == 0.001
+
+
+@pytest.mark.unit
+def test_report_lists_phases():
+    # pylint: disable=missing-docstring
+    report = format_report({'signup': PhaseStats(), 'login': PhaseStats()})
+
+    assert [line.split()[0] for line in report.splitlines()] == ['phase', 'signup', 'login']
+
+
+@pytest.fixture
+def recording(tmpdir):
+    """
+    A signup, login and post, where the post uses the token handed out by the login.
+    """
+    path = str(tmpdir.join('recording.jsonl'))
+    recorder = TrafficRecorder(path)
+
+    recorder.record('signup', recorder.start, 0, 'POST', 'http://old/api/v1/user/?bot=true', None,
+                    {'username': 'bot'}, 201, {'url': 'http://old/api/v1/user/1/'})
+    recorder.record('login', recorder.start + 1, 1, 'POST', 'http://old/api/v1/login/', None,
+                    {'username': 'bot'}, 200, {'token': 'old-token'})
+    recorder.record('post', recorder.start + 2, 2, 'POST', 'http://old/api/v1/post/',
+                    {'Authorization': 'JWT old-token'}, {'title': 'Title'}, 201, {'url': 'http://old/api/v1/post/1/'})
+    recorder.close()
+
+    return path
+
+
+@pytest.mark.unit
+def test_recorded_references(recording):
+    # pylint: disable=missing-docstring
+    with open(recording) as recorded:
+        signup, login, post = [json.loads(line) for line in recorded]
+
+    assert signup['path'] == '/api/v1/user/?bot=true'
+    assert login['produces'] == {'token': 'old-token'}
+    assert post['refs'] == ['old-token']
+    assert post['after'] == 2
+
+
+@pytest.mark.unit
+def test_recording_again_replaces_the_run(recording):
+    # pylint: disable=missing-docstring
+    recorder = TrafficRecorder(recording)
+    recorder.record('signup', recorder.start, 0, 'POST', 'http://old/api/v1/user/?bot=true', None,
+                    {'username': 'other'}, 201, {'url': 'http://old/api/v1/user/2/'})
+    recorder.close()
+
+    with open(recording) as recorded:
+        assert [json.loads(line)['seq'] for line in recorded] == [0]
+
+
+@pytest.mark.unit
+def test_replay_remaps_server_values(recording):
+    """
+    Replayed requests should use the values handed out by the server they're replayed against.
+    """
+    sent = []
+
+    async def send(method, url, headers, data):
+        sent.append((method, url, headers))
+        responses = {'/api/v1/user/?bot=true': (201, {'url': 'http://new/api/v1/user/7/'}),
+                     '/api/v1/login/': (200, {'token': 'new-token'}),
+                     '/api/v1/post/': (201, {'url': 'http://new/api/v1/post/7/'})}
+        return responses[url[len('http://new'):]]
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    stats = loop.run_until_complete(TrafficReplayer(send, 'http://new', speed=0).replay(recording))
+    loop.close()
+
+    assert [phase_stats.failures for phase_stats in stats.values()] == [0, 0, 0]
+    assert sent[-1] == ('POST', 'http://new/api/v1/post/', {'Authorization': 'JWT new-token'})
+
+
+@pytest.mark.unit
+def test_replay_swaps_overlapping_values(tmpdir):
+    """
+    A value handed out on replay that was another one's on record shouldn't be remapped again.
+    """
+    path = str(tmpdir.join('recording.jsonl'))
+    recorder = TrafficRecorder(path)
+
+    for seq, post_id in enumerate((1, 2)):
+        recorder.record('post', recorder.start + seq, seq, 'POST', 'http://old/api/v1/post/', None, {'title': 'Title'},
+                        201, {'url': f'http://old/api/v1/post/{post_id}/'})
+
+    recorder.record('like', recorder.start + 2, 2, 'POST', 'http://old/api/v1/post/batch/', None,
+                    {'urls': ['http://old/api/v1/post/1/', 'http://old/api/v1/post/2/']}, 200, {})
+    recorder.close()
+
+    new_ids = iter((2, 3))
+    sent = []
+
+    async def send(method, url, headers, data):
+        sent.append(data)
+        return 201, {'url': f'http://new/api/v1/post/{next(new_ids, None)}/'}
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.run_until_complete(TrafficReplayer(send, 'http://new', speed=0).replay(path))
+    loop.close()
+
+    assert sent[-1] == {'urls': ['/api/v1/post/2/', '/api/v1/post/3/']}
+
+
+@pytest.mark.unit
+def test_transport_closes_with_idle_threads():
+    """
+    Closing shouldn't wait on threads of the pool that never served a request.
+    """
+    def application(environ, start_response):
+        start_response('200 OK', [])
+        return [b'{}']
+
+    transport = WSGITransport(application, threads=4)
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    assert loop.run_until_complete(transport.request('GET', 'http://localhost/')) == (200, {})
+    loop.close()
+
+    closing = threading.Thread(target=transport.close, daemon=True)
+    closing.start()
+    closing.join(5)
+
+    assert not closing.is_alive()
+
+
+@pytest.mark.unit
+def test_scenario_arrivals_follow_the_ramped_rate():
+    """
+    A linear ramp-up should deliver half the rate over its duration, the full rate after it.
+    """
+    scenario = Scenario('test', rate=100, ramp_up=10, duration=60, mix={'read_newsfeed': 1})
+
+    offsets = [offset for offset, _ in scenario.arrivals(random.Random(0))]
+
+    assert offsets == sorted(offsets)
+    assert offsets[-1] < 60
+    assert len([offset for offset in offsets if offset < 10]) == pytest.approx(500, rel=0.1)
+    assert len(offsets) == pytest.approx(100 * 50 + 500, rel=0.05)
+
+
+@pytest.mark.unit
+def test_scenario_mix():
+    # pylint: disable=missing-docstring
+    scenario = Scenario('test', rate=100, duration=100, mix={'read_newsfeed': 3, 'post': 1})
+
+    actions = collections.Counter(action for _, action in scenario.arrivals(random.Random(0)))
+
+    assert actions['read_newsfeed'] / actions['post'] == pytest.approx(3, rel=0.1)
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize('config', [
+    {'rate': 0, 'duration': 10, 'mix': {'post': 1}},
+    {'rate': 10, 'duration': 10, 'mix': {'post': 1, 'repost': 1}},
+    {'rate': 10, 'duration': 10, 'mix': {'post': 0}},
+])
+def test_misconfigured_scenarios(config):
+    # pylint: disable=missing-docstring
+    with pytest.raises(ValueError):
+        Scenario.from_config('test', config)
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.integration
+def test_in_process_run(tmpdir):
+    """
+    A whole bot run against the WSGI application, without a server.
+    """
+    config = tmpdir.join('config.yml')
+    config.write('number_of_users: 3\nmax_posts_per_user: 2\nmax_likes_per_user: 2\n')
+    output = io.StringIO()
+
+    call_command('bot', '--in-process', config=str(config), stdout=output)
+
+    report = {line.split()[0]: line.split()[1:] for line in output.getvalue().splitlines()[1:]}
+
+    assert list(report) == ['signup', 'login', 'post', 'like']
+    assert report['signup'][:2] == ['3', '0']
+    assert all(failures == '0' for _, failures, *_ in report.values())
+    assert Like.objects.count() == int(report['like'][0])
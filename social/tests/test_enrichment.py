@@ -0,0 +1,112 @@
+import io
+import time
+from datetime import timedelta
+
+import pytest
+import requests
+from django.core.management import call_command
+from django.utils import timezone
+
+from social.enrichment import Checkpoint, RateLimiter
+from social.factories import UserFactory
+from social.models import UserProfile
+
+
+class ClearbitStub:
+    """
+    Stands in for Clearbit's enrichment lookup: knows a company for every email at acme.com, nothing about the rest,
+    and fails for the emails starting with 'fail'.
+    """
+
+    def __init__(self):
+        self.emails = []
+
+    def __call__(self, email, stream):
+        # pylint: disable=unused-argument
+        self.emails.append(email)
+
+        if email.startswith('fail'):
+            raise requests.HTTPError('502 Server Error')
+
+        if email.endswith('@acme.com'):
+            return {'company': {'name': 'Acme Inc.', 'domain': 'Acme.com'}}
+
+        return None
+
+
+@pytest.fixture
+def clearbit_stub(mock):
+    stub = ClearbitStub()
+    mock.patch('clearbit.Enrichment.find', side_effect=stub)
+
+    return stub
+
+
+def bot_profile(email):
+    return UserFactory(email=email, user_profile__enrichment_data=None).user_profile
+
+
+@pytest.mark.unit
+def test_rate_limiter():
+    # pylint: disable=missing-docstring
+    limiter = RateLimiter(rate=50)
+    start = time.monotonic()
+
+    for _ in range(3):
+        limiter.wait()
+
+    assert time.monotonic() - start >= 0.04
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_backfill(clearbit_stub):
+    """
+    Profiles never enriched should be looked up and written back, the failed lookups left for the next run.
+    """
+    found, unknown, failed = bot_profile('ann@acme.com'), bot_profile('bob@example.com'), bot_profile('fail@acme.com')
+    enriched = UserFactory(email='cid@acme.com').user_profile
+
+    output = io.StringIO()
+    call_command('enrich', rate=0, batch_size=2, concurrency=2, stdout=output)
+
+    assert sorted(clearbit_stub.emails) == ['ann@acme.com', 'bob@example.com', 'fail@acme.com']
+    assert output.getvalue().splitlines()[-1] == '3 profiles looked up, 1 failed'
+
+    for profile in (found, unknown, failed, enriched):
+        profile.refresh_from_db()
+
+    assert found.company_name == 'Acme Inc.' and found.company_domain == 'acme.com' and found.enriched_at
+    # looked up, with nothing found, so not looked up again
+    assert unknown.enrichment_data is None and unknown.enriched_at
+    assert failed.enriched_at is None
+    assert enriched.enriched_at is None
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_backfill_resumes(clearbit_stub, tmpdir):
+    """
+    A resumed backfill should start after the last profile of the last batch written back.
+    """
+    first, second = bot_profile('ann@acme.com'), bot_profile('bob@acme.com')
+    checkpoint = Checkpoint(str(tmpdir.join('checkpoint.json')))
+    checkpoint.save(first.pk)
+
+    call_command('enrich', rate=0, checkpoint=checkpoint.path, resume=True, stdout=io.StringIO())
+
+    assert clearbit_stub.emails == ['bob@acme.com']
+    assert checkpoint.load() == second.pk
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_refresh_stale_profiles(clearbit_stub):
+    # pylint: disable=missing-docstring
+    stale, fresh = UserFactory(email='ann@acme.com').user_profile, UserFactory(email='bob@acme.com').user_profile
+    UserProfile.objects.filter(pk=stale.pk).update(enriched_at=timezone.now() - timedelta(days=40))
+    UserProfile.objects.filter(pk=fresh.pk).update(enriched_at=timezone.now())
+
+    call_command('enrich', rate=0, refresh_days=30, stdout=io.StringIO())
+
+    assert clearbit_stub.emails == ['ann@acme.com']
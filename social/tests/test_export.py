@@ -0,0 +1,88 @@
+import gzip
+import json
+
+import pytest
+from django.core.management import call_command
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from social.factories import PostFactory, UserFactory
+
+
+@pytest.fixture
+def staff_client():
+    client = APIClient()
+    client.force_authenticate(UserFactory(is_staff=True))
+
+    return client
+
+
+def read_ndjson(content):
+    return [json.loads(line) for line in content.decode().splitlines()]
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_export_posts_since_id(staff_client):
+    """
+    Only the posts after the watermark should be exported, one JSON object per line.
+    """
+    first, second = PostFactory(), PostFactory()
+
+    response = staff_client.get(f'/api/v1/export/posts/?since_id={first.pk}')
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response['Content-Type'] == 'application/x-ndjson'
+
+    rows = read_ndjson(b''.join(response.streaming_content))
+    assert [row['id'] for row in rows] == [second.pk]
+    assert rows[0]['title'] == second.title
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_export_gzipped(staff_client):
+    """
+    Clients accepting gzip should get the export compressed.
+    """
+    PostFactory()
+
+    response = staff_client.get('/api/v1/export/likes/', HTTP_ACCEPT_ENCODING='gzip')
+
+    assert response['Content-Encoding'] == 'gzip'
+    assert read_ndjson(gzip.decompress(b''.join(response.streaming_content))) == []
+    assert 'Accept-Encoding' in response['Vary']
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_export_refused_gzip(staff_client):
+    # pylint: disable=missing-docstring
+    response = staff_client.get('/api/v1/export/likes/', HTTP_ACCEPT_ENCODING='gzip;q=0, identity')
+
+    assert not response.has_header('Content-Encoding')
+    assert 'Accept-Encoding' in response['Vary']
+    assert read_ndjson(b''.join(response.streaming_content)) == []
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_export_requires_staff(authenticated_client):
+    # pylint: disable=missing-docstring
+    response = authenticated_client.get('/api/v1/export/users/')
+
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_export_command(tmpdir):
+    # pylint: disable=missing-docstring
+    users = [UserFactory(), UserFactory()]
+    output = tmpdir.join('users.ndjson.gz')
+
+    call_command('export', 'users', output=str(output), gzip=True)
+
+    rows = read_ndjson(gzip.decompress(output.read_binary()))
+    assert [row['username'] for row in rows] == [user.username for user in users]
+    assert 'password' not in rows[0]
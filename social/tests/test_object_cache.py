@@ -0,0 +1,153 @@
+import json
+import threading
+
+import pytest
+from django.core.cache import caches
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.permissions import BasePermission
+from rest_framework.reverse import reverse
+
+from social.factories import PostFactory
+from social.models import Post
+from social.object_cache import ObjectCache
+from social.views import PostViewSet
+
+
+@pytest.mark.unit
+def test_only_one_rebuild(object_cache):
+    """
+    While an entry is being rebuilt, other readers should wait for it rather than rebuild it themselves.
+    """
+    cache = ObjectCache(object_cache, timeout=60, lock_timeout=5, poll_interval=0.01)
+    key = cache.key(Post, 1, 'variant')
+
+    # someone else is rebuilding it
+    object_cache.add(f'lock:{key}', 'token', 5)
+    threading.Timer(0.05, lambda: object_cache.set(key, {'title': 'Cached'})).start()
+
+    def build():
+        raise AssertionError('Should not rebuild.')
+
+    assert cache.get_or_build(Post, 1, 'variant', build) == {'title': 'Cached'}
+
+
+@pytest.mark.unit
+def test_bump_leaves_entries_behind(object_cache):
+    # pylint: disable=missing-docstring
+    cache = ObjectCache(object_cache, timeout=60, lock_timeout=5, poll_interval=0.01)
+
+    assert cache.get_or_build(Post, 1, 'variant', lambda: {'title': 'Old'}) == {'title': 'Old'}
+    assert cache.get_or_build(Post, 1, 'variant', lambda: {'title': 'New'}) == {'title': 'Old'}
+
+    cache.bump(Post, 1)
+
+    assert cache.get_or_build(Post, 1, 'variant', lambda: {'title': 'New'}) == {'title': 'New'}
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_cached_post_detail(authenticated_client, user):
+    """
+    Post details should be served from the cache until the post changes, with the user's like always up to date.
+    """
+    post = PostFactory(author=user)
+    url = reverse('post-detail', args=(post.pk,))
+
+    first = json.loads(authenticated_client.get(url).content)
+
+    with CaptureQueriesContext(connection) as queries:
+        assert json.loads(authenticated_client.get(url).content) == first
+
+    # authentication and the like url only
+    assert not any('FROM "social_post"' in query['sql'] for query in queries.captured_queries)
+
+    authenticated_client.post(reverse('post-like', args=(post.pk,)))
+    liked = json.loads(authenticated_client.get(url).content)
+
+    assert liked['n_likes'] == 1 and liked['like_url'] is not None
+
+    authenticated_client.patch(url, data={'title': 'Edited'})
+
+    assert json.loads(authenticated_client.get(url).content)['title'] == 'Edited'
+    assert list(json.loads(authenticated_client.get(url, {'fields': 'title'}).content)) == ['title']
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_cached_post_detail_is_filtered(client):
+    """
+    Params filtering the view's queryset should apply to cached details too.
+    """
+    post = PostFactory()
+    url = reverse('post-detail', args=(post.pk,))
+
+    assert client.get(url).status_code == status.HTTP_200_OK
+    assert client.get(url, {'likes': 5}).status_code == status.HTTP_404_NOT_FOUND
+    assert client.get(url, {'likes': 0}).status_code == status.HTTP_200_OK
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_cached_post_detail_by_padded_pk(client, user):
+    """
+    Entries reached through other spellings of the pk should be left behind too.
+    """
+    post = PostFactory(author=user)
+    padded_url = f'/api/v1/post/0{post.pk}/'
+
+    assert json.loads(client.get(padded_url).content)['title'] == post.title
+
+    post.title = 'Edited'
+    post.save()
+
+    assert json.loads(client.get(padded_url).content)['title'] == 'Edited'
+    assert client.get('/api/v1/post/x/').status_code == status.HTTP_404_NOT_FOUND
+
+
+class DenyObjects(BasePermission):
+
+    def has_object_permission(self, request, view, obj):
+        return False
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_cached_post_detail_permissions(authenticated_client, monkeypatch):
+    """
+    Object permissions should be checked on cache hits too.
+    """
+    post = PostFactory()
+    url = reverse('post-detail', args=(post.pk,))
+
+    assert authenticated_client.get(url).status_code == status.HTTP_200_OK
+
+    monkeypatch.setattr(PostViewSet, 'permission_classes', (DenyObjects,))
+
+    assert authenticated_client.get(url).status_code == status.HTTP_403_FORBIDDEN
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_cached_user_detail(client, user, settings):
+    """
+    User details should follow the user's posts, and not be cached at all with the cache off.
+    """
+    url = reverse('user-detail', args=(user.pk,))
+
+    assert json.loads(client.get(url).content)['posts'] == []
+
+    PostFactory(author=user)
+
+    assert len(json.loads(client.get(url).content)['posts']) == 1
+
+    settings.REST_FRAMEWORK = dict(settings.REST_FRAMEWORK, OBJECT_CACHE={'CACHE': None})
+    caches['objects'].clear()
+
+    client.get(url)
+
+    with CaptureQueriesContext(connection) as queries:
+        client.get(url)
+
+    assert queries.captured_queries
@@ -1,9 +1,13 @@
 import json
 
 import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 from rest_framework.reverse import reverse
 
+from social.factories import PostFactory
+
 
 # Could be split into two tests, but adds no significant value, at the cost of two integration tests.
 @pytest.mark.django_db
@@ -22,3 +26,207 @@ def test_post_creation(authenticated_client, post_dict, user, bogus_request):
 
     assert post_json_response['author'] == user_url
 
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_like_count_follows_likes(authenticated_client):
+    """
+    The denormalized like count should follow liking and unliking through the post routes.
+    """
+    post = PostFactory()
+
+    authenticated_client.post(reverse('post-like', args=(post.pk,)))
+    post.refresh_from_db()
+    assert post.like_count == 1
+
+    authenticated_client.delete(reverse('post-unlike', args=(post.pk,)))
+    post.refresh_from_db()
+    assert post.like_count == 0
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_unliked_posts_by_author(client, bogus_request):
+    """
+    Only posts without likes should be listed, grouped under their authors, one page of authors at a time.
+    """
+    PostFactory(like_count=1)
+    unliked = PostFactory()
+    other_unliked = PostFactory()
+
+    response = client.get(reverse('post-unliked'), {'page_size': 1})
+    assert response.status_code == status.HTTP_200_OK
+
+    first_page = json.loads(response.content)
+    assert first_page['results'] == [{
+        'author': reverse('user-detail', args=(unliked.author.pk,), request=bogus_request),
+        'posts': [reverse('post-detail', args=(unliked.pk,), request=bogus_request)],
+    }]
+
+    second_page = json.loads(client.get(first_page['next']).content)
+    assert second_page['next'] is None
+    assert [author['author'] for author in second_page['results']] == [
+        reverse('user-detail', args=(other_unliked.author.pk,), request=bogus_request)
+    ]
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+@pytest.mark.parametrize('page_size', ['0', '-1', 'one'])
+def test_unliked_page_size_is_validated(client, page_size):
+    # pylint: disable=missing-docstring
+    PostFactory()
+
+    response = client.get(reverse('post-unliked'), {'page_size': page_size})
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_sparse_newsfeed(authenticated_client):
+    """
+    Only the requested fields should be rendered.
+    """
+    post = PostFactory()
+
+    response = authenticated_client.get(reverse('post-newsfeed'), {'fields': 'url,title,n_likes'})
+
+    assert json.loads(response.content) == [{
+        'url': f'http://testserver{reverse("post-detail", args=(post.pk,))}',
+        'title': post.title,
+        'n_likes': 0,
+    }]
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_omitted_post_fields(authenticated_client):
+    # pylint: disable=missing-docstring
+    PostFactory()
+
+    response = authenticated_client.get(reverse('post-list'), {'omit': 'text,like_url,like_action'})
+
+    assert set(json.loads(response.content)[0]) == {'url', 'created_at', 'title', 'author', 'n_likes'}
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_like_urls_are_fetched_per_page(authenticated_client):
+    """
+    Rendering like urls shouldn't cost a query per post.
+    """
+    PostFactory()
+
+    with CaptureQueriesContext(connection) as single_post:
+        authenticated_client.get(reverse('post-list'))
+
+    PostFactory.create_batch(3)
+
+    with CaptureQueriesContext(connection) as several_posts:
+        authenticated_client.get(reverse('post-list'))
+
+    assert len(several_posts) == len(single_post)
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_batch_by_ids(authenticated_client):
+    """
+    Posts should come back in the requested order, the ids matching none reported as missing, in as many queries
+    whatever the number of posts.
+    """
+    posts = PostFactory.create_batch(3)
+    ids = [posts[2].pk, 0, posts[0].pk]
+
+    with CaptureQueriesContext(connection) as single_post:
+        authenticated_client.get(reverse('post-batch'), {'ids': posts[1].pk, 'fields': 'url,like_url'})
+
+    with CaptureQueriesContext(connection) as several_posts:
+        response = authenticated_client.get(reverse('post-batch'),
+                                            {'ids': ','.join(map(str, ids)), 'fields': 'url,like_url'})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert len(several_posts) == len(single_post)
+
+    data = json.loads(response.content)
+    assert [post['url'].rstrip('/').rsplit('/', 1)[1] for post in data['results']] == [str(posts[2].pk),
+                                                                                     str(posts[0].pk)]
+    assert data['missing'] == [0]
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_batch_with_invalid_ids(authenticated_client, bogus_request):
+    """
+    Ids that can't be pks are reported missing, as they are.
+    """
+    post = PostFactory()
+    post_url = reverse('post-detail', args=(post.pk,), request=bogus_request)
+
+    response = authenticated_client.get(reverse('post-batch'), {'ids': f'{post.pk},²,-1', 'fields': 'url'})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert json.loads(response.content) == {'results': [{'url': post_url}], 'missing': ['²', '-1']}
+
+    response = authenticated_client.post(f'{reverse("post-batch")}?fields=url', data={'urls': ['/api/v1/post/²/']})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert json.loads(response.content) == {'results': [], 'missing': ['/api/v1/post/²/']}
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_batch_by_urls(authenticated_client, bogus_request):
+    # pylint: disable=missing-docstring
+    post = PostFactory()
+    post_url = reverse('post-detail', args=(post.pk,), request=bogus_request)
+    user_url = reverse('user-detail', args=(post.author.pk,), request=bogus_request)
+
+    response = authenticated_client.post(f'{reverse("post-batch")}?fields=url,like_action',
+                                         data={'urls': [post_url, user_url]})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert json.loads(response.content) == {
+        'results': [{'url': post_url, 'like_action': reverse('post-like', args=(post.pk,), request=bogus_request)}],
+        'missing': [user_url],
+    }
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_batch_by_urls_queries(authenticated_client, bogus_request):
+    """
+    Looking posts up by url is a read, it shouldn't load the fields left out, post by post.
+    """
+    posts = PostFactory.create_batch(5)
+    urls = [reverse('post-detail', args=(post.pk,), request=bogus_request) for post in posts]
+
+    with CaptureQueriesContext(connection) as single_post:
+        authenticated_client.post(f'{reverse("post-batch")}?fields=like_action', data={'urls': urls[:1]})
+
+    with CaptureQueriesContext(connection) as several_posts:
+        response = authenticated_client.post(f'{reverse("post-batch")}?fields=like_action', data={'urls': urls})
+
+    assert len(json.loads(response.content)['results']) == 5
+    assert len(several_posts) == len(single_post)
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_batch_size_is_bounded(client):
+    # pylint: disable=missing-docstring
+    response = client.get(reverse('post-batch'), {'ids': ','.join(map(str, range(1, 102)))})
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+@pytest.mark.parametrize('body', [[1], {'urls': 'not a list'}, 'urls'])
+def test_batch_body_is_validated(client, body):
+    # pylint: disable=missing-docstring
+    response = client.post(reverse('post-batch'), data=json.dumps(body), content_type='application/json')
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
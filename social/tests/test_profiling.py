@@ -0,0 +1,106 @@
+import cProfile
+import io
+
+import pytest
+from django.core.management import call_command
+from django.db import connections
+from rest_framework.reverse import reverse
+
+from social.factories import PostFactory
+from social.instrumentation import execute_wrapper
+from social.models import Post
+from social.profiling import ProfileStore
+
+
+@pytest.fixture
+def profiling(settings, tmpdir):
+    """
+    Profiles the requests carrying the token, into a temporary directory.
+    """
+    config = {'TOKEN': 'secret', 'SAMPLE_RATE': 0.0, 'DIRECTORY': str(tmpdir), 'MAX_PROFILES': 3}
+    settings.REST_FRAMEWORK = dict(settings.REST_FRAMEWORK, PROFILING=config)
+
+    return ProfileStore.from_config(config)
+
+
+@pytest.mark.unit
+def test_store_drops_oldest_captures(tmpdir):
+    # pylint: disable=missing-docstring
+    store = ProfileStore(str(tmpdir), max_profiles=2)
+
+    ids = [store.save(cProfile.Profile(), {'path': f'/{i}/'}) for i in range(3)]
+
+    assert store.ids() == ids[1:]
+    assert [metadata['path'] for metadata in store] == ['/1/', '/2/']
+    assert len(tmpdir.listdir()) == 4
+
+
+@pytest.mark.django_db
+@pytest.mark.unit
+def test_execute_wrapper():
+    """
+    Wrappers should see the queries run within the block, and only those.
+    """
+    seen = []
+
+    def wrapper(execute, sql, params, many, context):
+        seen.append(sql)
+        return execute(sql, params, many, context)
+
+    with execute_wrapper(connections['default'], wrapper):
+        assert Post.objects.count() == 0
+
+    Post.objects.count()
+
+    assert len(seen) == 1 and 'COUNT' in seen[0]
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_profiled_request(profiling, authenticated_client, user):
+    """
+    Requests carrying the token should be profiled, with their route, user and queries.
+    """
+    PostFactory.create_batch(2)
+
+    response = authenticated_client.get(reverse('post-newsfeed'), HTTP_X_PROFILE='secret')
+
+    metadata = profiling.load(response['X-Profile-Id'])
+
+    assert metadata['route'] == 'post-newsfeed'
+    assert metadata['user'] == user.pk
+    assert metadata['status'] == 200
+    assert metadata['latency'] > 0
+    assert any('social_post' in query['sql'] for query in metadata['queries'])
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_unprofiled_requests(profiling, authenticated_client):
+    """
+    Requests without the right token shouldn't be profiled when nothing is sampled.
+    """
+    for headers in ({}, {'HTTP_X_PROFILE': 'guess'}):
+        response = authenticated_client.get(reverse('post-newsfeed'), **headers)
+
+        assert response.status_code == 200
+        assert not response.has_header('X-Profile-Id')
+
+    assert profiling.ids() == []
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_profiles_command(profiling, authenticated_client):
+    # pylint: disable=missing-docstring
+    capture_id = authenticated_client.get(reverse('post-newsfeed'), HTTP_X_PROFILE='secret')['X-Profile-Id']
+
+    output = io.StringIO()
+    call_command('profiles', stdout=output)
+
+    assert capture_id in output.getvalue() and 'post-newsfeed' in output.getvalue()
+
+    output = io.StringIO()
+    call_command('profiles', capture_id, stdout=output)
+
+    assert 'function calls' in output.getvalue() and 'social_post' in output.getvalue()
@@ -0,0 +1,76 @@
+import gzip
+import json
+
+import brotli
+import msgpack
+import pytest
+from django.utils.translation import ugettext_lazy
+from rest_framework.renderers import JSONRenderer
+from rest_framework.reverse import reverse
+
+from social.factories import PostFactory
+from social.middleware import accepted_encodings
+from social.renderers import FastJSONRenderer, MessagePackRenderer
+
+
+@pytest.mark.unit
+def test_fast_json_matches_rest_framework_json():
+    # pylint: disable=missing-docstring
+    data = {'title': 'Title', 'n_likes': 2, 'posts': ['http://testserver/api/v1/post/1/'], 'error': ugettext_lazy('Oops')}
+
+    assert FastJSONRenderer().render(data) == JSONRenderer().render(data)
+
+
+@pytest.mark.unit
+def test_messagepack_renderer():
+    # pylint: disable=missing-docstring
+    data = {'title': 'Title', 'n_likes': 2}
+
+    assert msgpack.unpackb(MessagePackRenderer().render(data), raw=False) == data
+
+
+@pytest.mark.unit
+def test_accepted_encodings():
+    # pylint: disable=missing-docstring
+    assert accepted_encodings('gzip, deflate;q=0.5, br;q=0') == {'gzip', 'deflate'}
+    # malformed weights refuse the coding, rather than failing the request
+    assert accepted_encodings('gzip;q=., br;q=1.2.3, deflate') == {'deflate'}
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_negotiated_messagepack_feed(authenticated_client):
+    """
+    Clients asking for MessagePack should get the same data as with JSON.
+    """
+    PostFactory()
+
+    response = authenticated_client.get(reverse('post-newsfeed'), HTTP_ACCEPT='application/msgpack')
+
+    assert response['Content-Type'] == 'application/msgpack'
+    assert msgpack.unpackb(response.content, raw=False) == json.loads(
+        authenticated_client.get(reverse('post-newsfeed')).content)
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+@pytest.mark.parametrize('encoding, decompress', [('gzip', gzip.decompress), ('br', brotli.decompress)])
+def test_compressed_feed(authenticated_client, encoding, decompress):
+    """
+    Responses above the size threshold should be compressed with an encoding the client accepts.
+    """
+    PostFactory.create_batch(5)
+
+    response = authenticated_client.get(reverse('post-newsfeed'), HTTP_ACCEPT_ENCODING=encoding)
+
+    assert response['Content-Encoding'] == encoding
+    assert len(json.loads(decompress(response.content))) == 5
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_small_responses_are_not_compressed(authenticated_client):
+    # pylint: disable=missing-docstring
+    response = authenticated_client.get(reverse('post-newsfeed'), HTTP_ACCEPT_ENCODING='gzip')
+
+    assert not response.has_header('Content-Encoding')
@@ -0,0 +1,84 @@
+import io
+
+import pytest
+from django.core.management import call_command
+from rest_framework.reverse import reverse
+
+from social import slow_queries
+from social.factories import PostFactory
+
+
+@pytest.fixture
+def log_everything(settings, slow_query_log):
+    """
+    Logs and explains every query.
+    """
+    config = {'THRESHOLD': 0.0, 'EXPLAIN_SAMPLE_RATE': 1.0, 'LOG': slow_query_log}
+    settings.REST_FRAMEWORK = dict(settings.REST_FRAMEWORK, SLOW_QUERIES=config)
+
+    return slow_query_log
+
+
+@pytest.mark.unit
+def test_fingerprint_ignores_arguments():
+    # pylint: disable=missing-docstring
+    assert slow_queries.normalize("SELECT * FROM t WHERE a = 1 AND b = 'x''y' AND c IN (%s, %s, %s)") == \
+        'SELECT * FROM t WHERE a = ? AND b = ? AND c IN (...)'
+    assert slow_queries.fingerprint('SELECT * FROM t WHERE id IN (1, 2)') == \
+        slow_queries.fingerprint('SELECT  * FROM t WHERE id IN (3)')
+    assert slow_queries.fingerprint('SELECT * FROM t2') != slow_queries.fingerprint('SELECT * FROM t')
+
+
+@pytest.mark.unit
+def test_locking_reads_are_not_explained():
+    # pylint: disable=missing-docstring
+    assert slow_queries.SlowQueryLog.explainable('SELECT * FROM t WHERE id = %s')
+    assert not slow_queries.SlowQueryLog.explainable('SELECT * FROM t WHERE id = %s FOR UPDATE')
+    assert not slow_queries.SlowQueryLog.explainable('select * from t for no key update nowait')
+    assert not slow_queries.SlowQueryLog.explainable('UPDATE t SET a = 1')
+
+
+@pytest.mark.unit
+def test_aggregate():
+    # pylint: disable=missing-docstring
+    entries = [
+        {'fingerprint': 'a', 'sql': 'SELECT 1', 'duration': 0.2, 'route': 'post-list', 'plan': [{'Plan': {}}]},
+        {'fingerprint': 'b', 'sql': 'SELECT 2 FROM t', 'duration': 0.5, 'route': 'post-list', 'plan': None},
+        {'fingerprint': 'a', 'sql': 'SELECT 3', 'duration': 0.4, 'route': 'post-newsfeed', 'plan': None},
+    ]
+
+    queries = slow_queries.aggregate(entries)
+
+    assert [query['fingerprint'] for query in queries] == ['a', 'b']
+    assert queries[0]['count'] == 2 and queries[0]['max'] == 0.4 and queries[0]['mean'] == pytest.approx(0.3)
+    assert queries[0]['routes'] == {'post-list': 1, 'post-newsfeed': 1}
+    assert queries[0]['plan'] == [{'Plan': {}}]
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_slow_queries_are_logged(log_everything, authenticated_client):
+    """
+    Slow queries should be logged with their route, and the reads explained.
+    """
+    PostFactory.create_batch(2)
+
+    assert authenticated_client.get(reverse('post-newsfeed')).status_code == 200
+
+    entries = list(slow_queries.read_log(log_everything))
+    posts = [entry for entry in entries if 'FROM "social_post"' in entry['sql']]
+
+    assert posts and all(entry['route'] == 'post-newsfeed' for entry in posts)
+    assert posts[0]['plan'][0]['Plan']
+    # the explains themselves aren't logged
+    assert not any(entry['sql'].startswith('EXPLAIN') for entry in entries)
+
+    output = io.StringIO()
+    call_command('slow_queries', stdout=output)
+
+    assert posts[0]['fingerprint'] in output.getvalue()
+
+    output = io.StringIO()
+    call_command('slow_queries', posts[0]['fingerprint'], stdout=output)
+
+    assert 'post-newsfeed' in output.getvalue() and '"Plan"' in output.getvalue()
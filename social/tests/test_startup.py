@@ -0,0 +1,55 @@
+import importlib
+
+import pytest
+from django.core.wsgi import get_wsgi_application
+from django.db import OperationalError
+from django.urls import resolve, reverse
+
+from tradecore import warmup
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_warm_up():
+    """
+    Warming up should go through every step, the request included, and leave the connection open.
+    """
+    from django.db import connection
+
+    timings = warmup.warm_up(get_wsgi_application())
+
+    assert list(timings) == ['urls', 'serializers', 'request', 'connect']
+    assert connection.connection is not None
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_warm_up_request():
+    # pylint: disable=missing-docstring
+    assert warmup.request(get_wsgi_application()).startswith('200')
+
+
+@pytest.mark.unit
+def test_warm_up_without_database(mock, settings):
+    """
+    A database down at boot should be logged, and not keep the worker from loading.
+    """
+    settings.WARM_UP = True
+    mock.patch('django.db.backends.base.base.BaseDatabaseWrapper.ensure_connection',
+               side_effect=OperationalError('could not connect to server'))
+    logger = mock.patch.object(warmup, 'logger')
+
+    import tradecore.wsgi
+    importlib.reload(tradecore.wsgi)
+
+    assert 'connect' not in warmup.warm_up(tradecore.wsgi.application)
+    assert logger.exception.called
+
+
+@pytest.mark.unit
+def test_lazy_admin_urls():
+    """
+    The admin urls are loaded on demand, but resolve and reverse as usual.
+    """
+    assert reverse('admin:index') == '/admin/'
+    assert resolve('/admin/auth/user/').view_name == 'admin:auth_user_changelist'
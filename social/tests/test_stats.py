@@ -0,0 +1,145 @@
+import json
+import threading
+
+import pytest
+from django.core.management import call_command
+from django.db import connection, transaction
+from rest_framework import status
+from rest_framework.reverse import reverse
+
+from social.factories import PostFactory, UserFactory
+from social.models import Like, UserStats
+from social.stats import count_likes
+
+
+def stats_of(user):
+    stats = UserStats.objects.get(user_profile__user=user)
+    return stats.post_count, stats.likes_given, stats.likes_received
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_stats_follow_posts_and_likes(authenticated_client, user, post_dict):
+    """
+    Writing, liking, unliking and deleting a post should be counted on both the author's and the liker's stats.
+    """
+    author = UserFactory()
+    post = PostFactory(author=author)
+    call_command('rebuild_stats')
+
+    authenticated_client.post(reverse('post-list'), data=post_dict)
+    authenticated_client.post(reverse('post-like', args=(post.pk,)))
+
+    assert stats_of(user) == (1, 1, 0)
+    assert stats_of(author) == (1, 0, 1)
+
+    authenticated_client.delete(reverse('post-unlike', args=(post.pk,)))
+
+    assert stats_of(user) == (1, 0, 0)
+    assert stats_of(author) == (1, 0, 0)
+
+    authenticated_client.post(reverse('post-like', args=(post.pk,)))
+    authenticated_client.delete(reverse('post-detail', args=(post.pk,)))
+
+    assert stats_of(user) == (1, 0, 0)
+    assert stats_of(author) == (0, 0, 0)
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_deleting_a_user_uncounts_their_activity(client):
+    """
+    The posts and likes going along with a user should come off everyone else's stats, and the posts' like counts.
+    """
+    user, other = UserFactory(), UserFactory()
+    own_post, other_post = PostFactory(author=user), PostFactory(author=other)
+
+    call_command('rebuild_stats')
+
+    for liker, post in ((user, own_post), (user, other_post), (other, own_post)):
+        Like.objects.create(user=liker, post=post)
+        count_likes(post.pk, liker.pk, 1)
+
+    assert stats_of(other) == (1, 1, 1)
+
+    client.force_authenticate(user)
+    client.delete(reverse('user-detail', args=(user.pk,)))
+
+    other_post.refresh_from_db()
+
+    assert stats_of(other) == (1, 0, 0)
+    assert other_post.like_count == 0
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_uncounted_likes_dont_go_negative(authenticated_client, user):
+    """
+    Likes the counts missed (e.g. created through the admin) shouldn't fail unliking or deleting.
+    """
+    post, other_post = PostFactory.create_batch(2)
+    Like.objects.create(user=user, post=post)
+    Like.objects.create(user=user, post=other_post)
+
+    response = authenticated_client.delete(reverse('post-unlike', args=(post.pk,)))
+    assert response.status_code == status.HTTP_200_OK
+
+    response = authenticated_client.delete(reverse('post-detail', args=(other_post.pk,)))
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+
+    post.refresh_from_db()
+
+    assert post.like_count == 0
+    assert stats_of(user) == (0, 0, 0)
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.integration
+def test_mutual_likes_dont_deadlock():
+    """
+    Two users liking each other's posts at the same time should both get counted.
+    """
+    users = UserFactory.create_batch(2)
+    posts = [PostFactory(author=author) for author in users]
+    call_command('rebuild_stats')
+    start = threading.Barrier(2, timeout=10)
+    errors = []
+
+    def like(liker, post):
+        try:
+            for delta in (1, -1) * 10:
+                start.wait()
+
+                with transaction.atomic():
+                    count_likes(post.pk, liker.pk, delta)
+        except Exception as error:  # pylint: disable=broad-except
+            errors.append(error)
+            start.abort()
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=like, args=(users[0], posts[1])),
+               threading.Thread(target=like, args=(users[1], posts[0]))]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert stats_of(users[0]) == stats_of(users[1]) == (1, 0, 0)
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_stats_are_shown(client, user):
+    # pylint: disable=missing-docstring
+    PostFactory.create_batch(2, author=user)
+    call_command('rebuild_stats', batch_size=1)
+
+    user_response = json.loads(client.get(reverse('user-detail', args=(user.pk,))).content)
+    profile_response = json.loads(client.get(reverse('userprofile-detail', args=(user.user_profile.pk,))).content)
+
+    assert user_response['stats'] == profile_response['stats'] == {'post_count': 2, 'likes_given': 0,
+                                                                    'likes_received': 0}
@@ -0,0 +1,90 @@
+import pytest
+from rest_framework import status
+from rest_framework.reverse import reverse
+from rest_framework.test import APIRequestFactory
+
+from social.throttling import TokenBucketThrottle
+
+
+class ThrottledView:
+    # pylint: disable=missing-docstring,too-few-public-methods
+    action = 'create'
+    throttle_scopes = {'create': 'test-create'}
+
+
+@pytest.fixture
+def throttle(settings, mock):
+    settings.REST_FRAMEWORK = dict(settings.REST_FRAMEWORK, DEFAULT_THROTTLE_RATES={'test-create': '2/min'})
+
+    throttle = TokenBucketThrottle()
+    throttle.timer = mock.Mock(return_value=1000.0)
+
+    return throttle
+
+
+def make_request():
+    request = APIRequestFactory().post('/')
+    request.user = None
+    return request
+
+
+@pytest.mark.unit
+def test_bucket_allows_burst_then_throttles(throttle):
+    # pylint: disable=missing-docstring
+    request = make_request()
+
+    assert throttle.allow_request(request, ThrottledView())
+    assert throttle.allow_request(request, ThrottledView())
+    assert not throttle.allow_request(request, ThrottledView())
+
+    # 2/min refills a token every 30 seconds
+    assert throttle.wait() == pytest.approx(30)
+
+
+@pytest.mark.unit
+def test_bucket_refills_over_time(throttle):
+    # pylint: disable=missing-docstring
+    request = make_request()
+
+    throttle.allow_request(request, ThrottledView())
+    throttle.allow_request(request, ThrottledView())
+
+    throttle.timer.return_value += 30
+
+    assert throttle.allow_request(request, ThrottledView())
+    assert not throttle.allow_request(request, ThrottledView())
+
+
+@pytest.mark.unit
+def test_scopes_without_a_rate_are_not_throttled(throttle, settings):
+    # pylint: disable=missing-docstring
+    settings.REST_FRAMEWORK = dict(settings.REST_FRAMEWORK, DEFAULT_THROTTLE_RATES={'test-create': None})
+    request = make_request()
+
+    assert all(throttle.allow_request(request, ThrottledView()) for _ in range(10))
+
+
+@pytest.mark.unit
+def test_unscoped_actions_are_not_throttled(throttle):
+    # pylint: disable=missing-docstring
+    view = ThrottledView()
+    view.action = 'list'
+
+    for _ in range(5):
+        assert throttle.allow_request(make_request(), view)
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_throttled_post_creation(settings, authenticated_client, post_dict):
+    """
+    Once the bucket is drained, the endpoint should respond with 429 and tell the client when to retry.
+    """
+    settings.REST_FRAMEWORK = dict(settings.REST_FRAMEWORK, DEFAULT_THROTTLE_RATES={'post-create': '1/min'})
+
+    response = authenticated_client.post(reverse('post-list'), data=post_dict)
+    assert response.status_code == status.HTTP_201_CREATED
+
+    response = authenticated_client.post(reverse('post-list'), data=post_dict)
+    assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert int(response['Retry-After']) > 0
@@ -1,4 +1,5 @@
 import pytest
+import requests
 from django.contrib.auth.hashers import check_password
 from rest_framework import status
 from rest_framework.test import APIClient
@@ -56,6 +57,23 @@ def test_hash_password_on_register(client, user_dict):
     assert check_password(user_dict['password'], user.password), "Password is not properly set at registration."
 
 
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_sparse_register(client, user_dict):
+    """
+    Asking for a few fields of the response shouldn't drop any of the input.
+    """
+    response = client.post('/api/v1/user/?bot=true&fields=url,username', user_dict)
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert list(response.json()) == ['url', 'username']
+
+    user = User.objects.get(username=user_dict['username'])
+
+    assert check_password(user_dict['password'], user.password)
+    assert user.email == user_dict['email']
+
+
 @pytest.mark.django_db
 @pytest.mark.integration
 def test_password_change(client, user):
@@ -78,3 +96,35 @@ def test_serializer_password_prepare():
     validated_data = serializer.prepare_password({'password': password})
 
     assert check_password(password, validated_data['password'])
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_register_when_enrichment_fails(mock, client, user_dict):
+    """
+    A failing Clearbit lookup shouldn't fail the registration, the profile is left to be enriched later on.
+    """
+    mock.patch('clearbit.Enrichment.find', side_effect=requests.ConnectionError())
+
+    response = client.post('/api/v1/user/', user_dict)
+
+    assert response.status_code == status.HTTP_201_CREATED
+
+    profile = User.objects.get(username=user_dict['username']).user_profile
+
+    assert profile.enrichment_data is None and profile.enriched_at is None
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_batch_of_users(client, user):
+    """
+    Users can be fetched several at once too, with the stats of the list view.
+    """
+    response = client.get('/api/v1/user/batch/', {'ids': f'{user.pk},0', 'fields': 'username,stats'})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {
+        'results': [{'username': user.username, 'stats': {'post_count': 0, 'likes_given': 0, 'likes_received': 0}}],
+        'missing': [0],
+    }
@@ -0,0 +1,76 @@
+import json
+
+import pytest
+from rest_framework import status
+
+from social.factories import UserFactory
+from social.models import UserProfile
+
+
+ENRICHMENT_DATA = {
+    'person': {'employment': {'name': 'Acme', 'domain': 'acme.com', 'role': 'engineering'}},
+    'company': {'name': 'Acme Inc.', 'domain': 'Acme.com'},
+}
+
+
+@pytest.fixture
+def enriched_profile():
+    profile = UserFactory().user_profile
+    profile.enrichment_data = ENRICHMENT_DATA
+    profile.save()
+
+    return profile
+
+
+@pytest.mark.unit
+def test_enrichment_projection():
+    # pylint: disable=missing-docstring
+    profile = UserProfile(enrichment_data=ENRICHMENT_DATA)
+    profile.project_enrichment_data()
+
+    assert (profile.company_name, profile.company_domain, profile.role) == ('Acme Inc.', 'acme.com', 'engineering')
+
+
+@pytest.mark.unit
+def test_enrichment_projection_falls_back_to_employment():
+    # pylint: disable=missing-docstring
+    profile = UserProfile(enrichment_data={'person': ENRICHMENT_DATA['person'], 'company': None})
+    profile.project_enrichment_data()
+
+    assert (profile.company_name, profile.company_domain) == ('Acme', 'acme.com')
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_filter_profiles_by_domain(client, enriched_profile):
+    """
+    Filtering should match on the projected columns, and lists should leave out the raw enrichment data.
+    """
+    UserFactory()
+
+    response = client.get('/api/v1/userprofile/', {'domain': 'ACME.com'})
+    assert response.status_code == status.HTTP_200_OK
+
+    profiles = json.loads(response.content)
+    assert len(profiles) == 1
+    assert profiles[0]['role'] == 'engineering'
+    assert 'enrichment_data' not in profiles[0]
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+def test_list_profiles_with_enrichment_data(client, enriched_profile):
+    # pylint: disable=missing-docstring
+    response = client.get('/api/v1/userprofile/', {'enrichment': 'true'})
+
+    assert json.loads(response.content)[0]['enrichment_data'] == ENRICHMENT_DATA
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+@pytest.mark.parametrize('enrichment', ['false', '0'])
+def test_list_profiles_without_enrichment_data(client, enriched_profile, enrichment):
+    # pylint: disable=missing-docstring
+    response = client.get('/api/v1/userprofile/', {'enrichment': enrichment})
+
+    assert 'enrichment_data' not in json.loads(response.content)[0]
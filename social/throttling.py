@@ -0,0 +1,109 @@
+"""
+Token bucket throttling for the write endpoints.
+
+Each client gets a bucket per throttle scope. Buckets hold up to `capacity` tokens and refill continuously at
+`capacity / period` tokens per second, so short bursts are allowed while the sustained rate is capped. Authenticated
+requests are bucketed per user, anonymous ones (e.g. signups) per client IP.
+
+The bucket state is a `(tokens, timestamp)` pair kept in a django cache, so every check is a single cache read and
+write, with no database access.
+"""
+
+import math
+import time
+
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import settings as rest_framework_settings
+from rest_framework.throttling import BaseThrottle
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Throttles the view actions listed in the view's `throttle_scopes` mapping, e.g.
+
+        throttle_scopes = {'create': 'post-create', 'like': 'post-like'}
+
+    Rates for the scopes are read from `DEFAULT_THROTTLE_RATES`, using the regular rest framework `<n>/<period>`
+    format. Actions without a scope, or whose scope's rate is None, are not throttled.
+
+    The cache alias is taken from the `THROTTLE_CACHE` rest framework setting (defaults to `default`). Local memory
+    is fine for tests and a single process; use a shared backend (memcached, redis) once there are several workers.
+
+    NOTE: The read-modify-write on the cache isn't atomic, so concurrent requests of the same client can occasionally
+          both take the last token. This is the same trade-off the rest framework's own throttles make.
+    """
+    cache_format = 'throttle_bucket_%(scope)s_%(ident)s'
+    timer = time.time
+
+    durations = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+    def __init__(self):
+        self.scope = None
+        self.wait_time = None
+
+    # NOTE: The rest framework replaces its settings object whenever the settings change (e.g. in tests), so it's
+    #       looked up on each access instead of being imported once.
+    @property
+    def api_settings(self):
+        return rest_framework_settings.api_settings
+
+    @property
+    def cache(self):
+        return caches[self.api_settings.user_settings.get('THROTTLE_CACHE', 'default')]
+
+    def get_scope(self, view):
+        return getattr(view, 'throttle_scopes', {}).get(getattr(view, 'action', None))
+
+    def parse_rate(self, rate):
+        """
+        Given the request rate string, return a `(capacity, refill per second)` tuple.
+        """
+        num, period = rate.split('/')
+        capacity = int(num)
+
+        return capacity, capacity / self.durations[period[0]]
+
+    def get_rate(self):
+        try:
+            return self.api_settings.DEFAULT_THROTTLE_RATES[self.scope]
+        except KeyError:
+            raise ImproperlyConfigured(f"No default throttle rate set for '{self.scope}' scope")
+
+    def get_cache_key(self, request):
+        if request.user and request.user.is_authenticated:
+            ident = f'user_{request.user.pk}'
+        else:
+            ident = f'ip_{self.get_ident(request)}'
+
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+    def allow_request(self, request, view):
+        self.scope = self.get_scope(view)
+
+        if self.scope is None:
+            return True
+
+        rate = self.get_rate()
+
+        if rate is None:
+            return True
+
+        capacity, refill = self.parse_rate(rate)
+        key = self.get_cache_key(request)
+        now = self.timer()
+
+        tokens, timestamp = self.cache.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - timestamp) * refill)
+
+        if tokens < 1:
+            self.wait_time = (1 - tokens) / refill
+            return False
+
+        # the entry can expire as soon as the bucket would have refilled anyway
+        self.cache.set(key, (tokens - 1, now), math.ceil(capacity / refill))
+
+        return True
+
+    def wait(self):
+        return self.wait_time
@@ -1,22 +1,95 @@
-import clearbit
+import itertools
+import re
+from urllib.parse import urlsplit
+
 from django.contrib.auth.models import User, AnonymousUser
 from django.db import transaction
-from django.db.models import Count
-from django.conf import settings
+from django.db.models import Count, Prefetch
+from django.http import Http404, StreamingHttpResponse
+from django.urls import Resolver404, resolve
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
 from rest_framework import viewsets, status
 from rest_framework.decorators import detail_route, list_route
 from rest_framework.filters import OrderingFilter
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from rest_framework.reverse import reverse
+from rest_framework.utils.urls import replace_query_param
 from rest_framework_jwt.authentication import JSONWebTokenAuthentication
 
-from social import serializers
+from social import enrichment, export, serializers
+from social.middleware import accepted_encodings
 from social.models import UserProfile, Post, Like
+from social.object_cache import CachedRetrieveMixin
+from social.stats import count_likes, count_posts, reassign_post, uncount_posts, uncount_user
+from social.throttling import TokenBucketThrottle
+
+
+class BatchRetrieveMixin:
+    """
+    Adds a `batch` route fetching several objects in one request, and in one query: by id with
+    `GET <list url>batch/?ids=1,2,3`, or by url by POSTing a list of detail urls as `urls`. The objects are fetched
+    like the list fetches them (fields, prefetching), and returned in the requested order:
+
+        {"results": [...], "missing": [<the ids or urls that matched no object>]}
+    """
+    batch_max_size = 100
+
+    @staticmethod
+    def parse_pk(pk):
+        # ascii digits only, isdigit() takes e.g. '²' which int() doesn't
+        return int(pk) if re.fullmatch(r'[0-9]+', pk) else None
+
+    def get_batch_pk(self, reference, by_url):
+        """
+        The pk of an id or a detail url, None if it can't be one.
+        """
+        if not by_url:
+            return self.parse_pk(reference)
+
+        try:
+            match = resolve(urlsplit(reference).path)
+        except Resolver404:
+            return None
+
+        model = self.get_serializer_class().Meta.model
 
+        if match.view_name != f'{model._meta.model_name}-detail':
+            return None
+
+        return self.parse_pk(match.kwargs.get('pk', ''))
+
+    @list_route(methods=['get', 'post'])
+    def batch(self, request):
+        by_url = request.method == 'POST'
+
+        if by_url and hasattr(request.data, 'getlist'):
+            references = request.data.getlist('urls')
+        elif by_url:
+            # a JSON body can be anything, e.g. a bare list
+            references = request.data.get('urls') if isinstance(request.data, dict) else None
+        else:
+            references = [reference for reference in request.query_params.get('ids', '').split(',') if reference]
+
+        if not isinstance(references, list) or len(references) > self.batch_max_size:
+            return Response({'error': f'Expected a list of at most {self.batch_max_size} ids or urls.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        pks = [self.get_batch_pk(str(reference), by_url) for reference in references]
+        objects = self.get_queryset().in_bulk([pk for pk in pks if pk is not None])
 
-class UserViewSet(viewsets.ModelViewSet):
-    queryset = User.objects.all()
+        serializer = self.get_serializer([objects[pk] for pk in pks if pk in objects], many=True)
+        missing = [int(reference) if not by_url and pk is not None else reference
+                   for reference, pk in zip(references, pks) if pk not in objects]
+
+        return Response({'results': serializer.data, 'missing': missing})
+
+
+class UserViewSet(BatchRetrieveMixin, CachedRetrieveMixin, viewsets.ModelViewSet):
     serializer_class = serializers.UserSerializer
+    throttle_classes = (TokenBucketThrottle,)
+    throttle_scopes = {'create': 'user-create'}
 
     def create(self, request, *args, **kwargs):
         # pylint: disable=attribute-defined-outside-init
@@ -28,31 +101,101 @@ class UserViewSet(viewsets.ModelViewSet):
         # NOTE: Consider using py3 sugar? super()
         return super(UserViewSet, self).create(request, *args, **kwargs)
 
+    def get_queryset(self):
+        fields = serializers.requested_fields(self.request, serializers.UserSerializer.Meta.fields)
+        queryset = User.objects.all()
+
+        deferred = [field for field in ('username', 'first_name', 'last_name', 'email') if field not in fields]
+
+        # both relations are rendered as links, their ids are all that's needed
+        if 'user_profile' in fields or 'stats' in fields:
+            queryset = queryset.select_related('user_profile__stats' if 'stats' in fields else 'user_profile')
+            deferred.append('user_profile__enrichment_data')
+
+        if 'posts' in fields:
+            queryset = queryset.prefetch_related(Prefetch('posts', queryset=Post.objects.only('id', 'author_id')))
+
+        if deferred:
+            queryset = queryset.defer(*deferred)
+
+        return queryset
+
     def perform_create(self, serializer):
         with transaction.atomic():
             user = serializer.save()
 
             enrichment_data = None
+            enriched_at = None
 
             if not self.bot:
-                # NOTE: Could be moved to social.apps and used as a module import to make sure it's initialized?
-                clearbit.key = settings.CLEARBIT_API_KEY
-                enrichment_data = clearbit.Enrichment.find(email=user.email, stream=True)
+                try:
+                    enrichment_data = enrichment.find(user.email)
+                    enriched_at = timezone.now()
+                except enrichment.EnrichmentError:
+                    # signing up shouldn't depend on Clearbit, the profile gets enriched later on (manage.py enrich)
+                    pass
+
+            UserProfile.objects.create(user=user, enrichment_data=enrichment_data, enriched_at=enriched_at)
 
-            UserProfile.objects.create(user=user, enrichment_data=enrichment_data)
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            uncount_user(instance)
+            instance.delete()
 
 
 class UserProfileViewSet(viewsets.ModelViewSet):
-    queryset = UserProfile.objects.all()
+    """
+    Profile lists can be filtered by the projected enrichment attributes: `?company=<name>`, `?domain=<domain>` and
+    `?role=<role>`.
+
+    The raw `enrichment_data` is left out of lists (and not even loaded) unless asked for with `?enrichment=true`.
+    """
     serializer_class = serializers.UserProfileSerializer
 
+    def include_enrichment_data(self):
+        if 'enrichment_data' not in serializers.requested_fields(self.request, ('enrichment_data',)):
+            return False
+
+        return self.action != 'list' or self.request.query_params.get('enrichment', '').lower() in ('true', '1')
+
+    def get_queryset(self):
+        queryset = UserProfile.objects.all()
+
+        if not self.include_enrichment_data():
+            queryset = queryset.defer('enrichment_data')
+
+        if 'stats' in serializers.requested_fields(self.request, ('stats',)):
+            queryset = queryset.select_related('stats')
+
+        filters = {'company': 'company_name', 'domain': 'company_domain', 'role': 'role'}
+
+        for param, field in filters.items():
+            value = self.request.query_params.get(param, None)
+
+            if value is not None:
+                # domains are stored lowercased
+                queryset = queryset.filter(**{field: value.lower() if param == 'domain' else value})
 
-class PostViewSet(viewsets.ModelViewSet):
+        return queryset
+
+    def get_serializer_class(self):
+        if not self.include_enrichment_data():
+            return serializers.UserProfileSummarySerializer
+
+        return self.serializer_class
+
+
+class PostViewSet(BatchRetrieveMixin, CachedRetrieveMixin, viewsets.ModelViewSet):
     """
+    Like the rest of the api, takes `?fields=a,b` or `?omit=a,b` to limit the fields returned; e.g. a lean feed is
+    `/api/v1/post/newsfeed/?fields=url,title,n_likes`.
+
     Unlisted routes (as per [#2062](https://github.com/tomchristie/django-rest-framework/issues/2062)):
 
     - `/api/v1/post/newsfeed/` - posts from users other than the logged in user
     - `/api/v1/post/personal/` - your own posts
+    - `/api/v1/post/unliked/` - authors that have posts with no likes, along with those posts
+    - `/api/v1/post/batch/` - several posts at once, see BatchRetrieveMixin
     - `/api/v1/post/<id>/like/` - like the post
     - delete request to `like_url` - unlike the post
 
@@ -60,26 +203,70 @@ class PostViewSet(viewsets.ModelViewSet):
                  liked
     """
     serializer_class = serializers.PostSerializer
+    # per user, computed on every request while the rest of the post detail is cached
+    uncached_fields = ('like_url',)
     filter_backends = (OrderingFilter,)
     ordering_fields = ('n_likes', 'created_at',)
+    unliked_page_size = 100
+    unliked_max_page_size = 1000
+    throttle_classes = (TokenBucketThrottle,)
+    throttle_scopes = {'create': 'post-create', 'like': 'post-like'}
 
     authentication_class = (JSONWebTokenAuthentication,)
 
     def get_queryset(self):
-        queryset = Post.objects.annotate(n_likes=Count('likes')).all()
+        fields = serializers.requested_fields(self.request, serializers.PostSerializer.Meta.fields)
+        queryset = Post.objects.all()
 
         n_likes = self.request.query_params.get('likes', None)
+        ordering = self.request.query_params.get(OrderingFilter.ordering_param, '')
+
+        # the aggregate is only worth its join when it's shown, filtered or ordered by
+        if 'n_likes' in fields or n_likes is not None or 'n_likes' in ordering:
+            queryset = queryset.annotate(n_likes=Count('likes'))
 
         if n_likes is not None:
             queryset = queryset.filter(n_likes=n_likes)
 
+        deferred = [field for field in ('created_at', 'title', 'text') if field not in fields]
+
+        if deferred:
+            queryset = queryset.defer(*deferred)
+
+        # fetch the user's likes for the whole page at once, instead of a query per post in like_url
+        if 'like_url' in fields and not isinstance(self.request.user, AnonymousUser):
+            queryset = queryset.prefetch_related(Prefetch('likes', queryset=Like.objects.filter(user=self.request.user),
+                                                          to_attr='user_likes'))
+
         return queryset
 
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            post = serializer.save()
+            count_posts(post.author_id, 1)
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            author_id = serializer.instance.author_id
+            post = serializer.save()
+
+            if post.author_id != author_id:
+                reassign_post(post, author_id)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            uncount_posts(Post.objects.filter(pk=instance.pk))
+            instance.delete()
+
     @detail_route(methods=['post'])
     def like(self, request, pk=None):
         post = self.get_object()
 
-        like, created = Like.objects.get_or_create(post=post, user=request.user)
+        with transaction.atomic():
+            like, created = Like.objects.get_or_create(post=post, user=request.user)
+
+            if created:
+                count_likes(post.pk, request.user.pk, 1)
 
         # We should notify about an already existing like
         if not created:
@@ -93,7 +280,9 @@ class PostViewSet(viewsets.ModelViewSet):
     def unlike(self, request, pk=None):
         post = self.get_object()
 
-        _, result = Like.objects.filter(post=post, user=request.user).delete()
+        with transaction.atomic():
+            _, result = Like.objects.filter(post=post, user=request.user).delete()
+            count_likes(post.pk, request.user.pk, -result.get('social.Like', 0))
 
         return Response(result)
 
@@ -108,16 +297,59 @@ class PostViewSet(viewsets.ModelViewSet):
 
     @list_route(methods=['get'])
     def personal(self, request):
-        queryset = self.filter_queryset(Post.objects.filter(author=request.user))
+        queryset = self.filter_queryset(self.get_queryset().filter(author=request.user))
 
         return self.render_list_response(queryset)
 
     @list_route(methods=['get'])
     def newsfeed(self, request):
-        queryset = self.filter_queryset(Post.objects.exclude(author=request.user))
+        queryset = self.filter_queryset(self.get_queryset().exclude(author=request.user))
 
         return self.render_list_response(queryset)
 
+    @list_route(methods=['get'])
+    def unliked(self, request):
+        """
+        Authors that still have posts with no likes, each with the urls of those posts, ordered by author.
+
+        Paginated by author: `?page_size=<n>` sets the number of authors per page, and `next` links to the following
+        page. Both queries are served by the partial index on zero-like posts.
+        """
+        try:
+            page_size = min(int(request.query_params.get('page_size', self.unliked_page_size)),
+                            self.unliked_max_page_size)
+            cursor = int(request.query_params.get('cursor', 0))
+            valid = page_size >= 1
+        except ValueError:
+            valid = False
+
+        if not valid:
+            return Response({'error': 'Both page_size and cursor should be integers, page_size a positive one.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        unliked_posts = Post.objects.filter(like_count=0)
+
+        # fetch one author too many, to know whether there's a next page
+        author_ids = list(unliked_posts.filter(author_id__gt=cursor)
+                          .order_by('author_id')
+                          .values_list('author_id', flat=True)
+                          .distinct()[:page_size + 1])
+        next_url = None
+
+        if len(author_ids) > page_size:
+            author_ids = author_ids[:page_size]
+            next_url = replace_query_param(request.build_absolute_uri(), 'cursor', author_ids[-1])
+
+        posts = (unliked_posts.filter(author_id__in=author_ids)
+                 .order_by('author_id', 'id')
+                 .values_list('author_id', 'id'))
+
+        results = [{'author': reverse('user-detail', args=[author_id], request=request),
+                    'posts': [reverse('post-detail', args=[post_id], request=request) for _, post_id in author_posts]}
+                   for author_id, author_posts in itertools.groupby(posts.iterator(), lambda post: post[0])]
+
+        return Response({'next': next_url, 'results': results})
+
 
 class LikeViewSet(viewsets.ModelViewSet):
     """
@@ -127,6 +359,16 @@ class LikeViewSet(viewsets.ModelViewSet):
     """
     serializer_class = serializers.LikeSerializer
 
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            like = serializer.save()
+            count_likes(like.post_id, like.user_id, 1)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            instance.delete()
+            count_likes(instance.post_id, instance.user_id, -1)
+
     def get_queryset(self):
         try:
             return self.request.user.likes.all()
@@ -135,3 +377,50 @@ class LikeViewSet(viewsets.ModelViewSet):
                 raise
             return None
 
+
+class ExportViewSet(viewsets.ViewSet):
+    """
+    Streams whole tables as newline delimited JSON, for analytics. Staff only.
+
+    - `/api/v1/export/posts/`
+    - `/api/v1/export/likes/`
+    - `/api/v1/export/users/`
+
+    Incremental pulls: `?since_id=<id>` exports rows with a greater id, `?since=<ISO 8601 timestamp>` rows created
+    after it (posts and users only). The export is gzipped if the client accepts it.
+    """
+    permission_classes = (IsAdminUser,)
+
+    def list(self, request):
+        return Response({name: reverse('export-detail', args=[name], request=request) for name in export.EXPORTS})
+
+    def retrieve(self, request, pk=None):
+        if pk not in export.EXPORTS:
+            raise Http404
+
+        compress = 'gzip' in accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+
+        try:
+            since_id = request.query_params.get('since_id', None)
+            since_id = int(since_id) if since_id is not None else None
+            since = export.parse_since(request.query_params.get('since', None))
+            # the generator only runs once iterated, check the parameters apply to the export upfront
+            export.EXPORTS[pk].get_queryset(since_id, since)
+        except ValueError as error:
+            return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(export.export(pk, since_id, since, compress),
+                                         content_type='application/x-ndjson')
+
+        if compress:
+            response['Content-Encoding'] = 'gzip'
+
+        return response
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super(ExportViewSet, self).finalize_response(request, response, *args, **kwargs)
+
+        # gzipped or not at the same url; patched once rest framework is done, it overwrites Vary
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        return response
@@ -0,0 +1,10 @@
+"""
+Admin URL configuration, imported on the first request to the admin rather than on startup (see tradecore.urls).
+"""
+from django.contrib import admin
+
+# the admin app is installed without autodiscovery, the model admins are only needed from here on
+admin.autodiscover()
+
+# pylint: disable=invalid-name
+urlpatterns = admin.site.get_urls()
@@ -31,7 +31,8 @@ ALLOWED_HOSTS = []
 # Application definition
 
 INSTALLED_APPS = [
-    'django.contrib.admin',
+    # Without autodiscovery, which happens along with the admin urls instead (tradecore.admin_urls)
+    'django.contrib.admin.apps.SimpleAdminConfig',
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
@@ -44,7 +45,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'social.middleware.ProfilingMiddleware',
+    'social.middleware.SlowQueryMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'social.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -73,6 +77,9 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'tradecore.wsgi.application'
 
+# Whether tradecore.wsgi warms the worker up as it's loaded (see tradecore.warmup)
+WARM_UP = os.environ.get('DJANGO_WARM_UP', 'true').lower() == 'true'
+
 
 # Database
 # https://docs.djangoproject.com/en/1.10/ref/settings/#databases
@@ -84,11 +91,37 @@ DATABASES = {
         'USER': 'tradecore',
         'PASSWORD': 'tradecore',
         'HOST': '127.0.0.1',
-        'PORT': '5432'
+        'PORT': '5432',
+        # Seconds a connection is kept between requests, so that the connection warmed up at startup gets used
+        'CONN_MAX_AGE': 60,
     }
 }
 
 
+# Caches
+# https://docs.djangoproject.com/en/1.10/topics/cache/
+# NOTE: Local memory caches are per process. With more than one worker, the throttle cache should be pointed at a
+#       shared backend (e.g. memcached), otherwise every worker hands out its own set of tokens.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'throttle': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'throttle',
+    },
+    # Post and user details (social.object_cache). Shared by all the workers once pointed at a shared backend.
+    'objects': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'objects',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/1.10/ref/settings/#auth-password-validators
 
@@ -127,6 +160,13 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 
+# Throttle rates can be overridden per scope from the environment, see DEFAULT_THROTTLE_RATES
+
+def throttle_rate(scope, default):
+    rate = os.environ.get(f'DJANGO_THROTTLE_{scope.upper().replace("-", "_")}', default)
+    return None if rate.lower() == 'off' else rate
+
+
 # Rest framework configuration
 
 REST_FRAMEWORK = {
@@ -137,7 +177,52 @@ REST_FRAMEWORK = {
         'rest_framework.authentication.BasicAuthentication',
         'rest_framework.authentication.SessionAuthentication',
         'rest_framework_jwt.authentication.JSONWebTokenAuthentication',
-    )
+    ),
+    # Picked by the Accept header (or ?format=); plain application/json gets the faster orjson based renderer
+    'DEFAULT_RENDERER_CLASSES': (
+        'social.renderers.FastJSONRenderer',
+        'social.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    # Response compression (social.middleware.CompressionMiddleware)
+    'COMPRESSION': {
+        'MIN_SIZE': 1024,
+        'ENCODINGS': ('br', 'gzip'),
+        'BROTLI_QUALITY': 4,
+    },
+    # Request profiling (social.middleware.ProfilingMiddleware), captures are listed with `manage.py profiles`.
+    # Requests are profiled on demand by sending the token in an X-Profile header, or at random at the sample rate.
+    'PROFILING': {
+        'TOKEN': os.environ.get('PROFILING_TOKEN', None),
+        'SAMPLE_RATE': 0.0,
+        'DIRECTORY': os.path.join(BASE_DIR, 'profiles'),
+        'MAX_PROFILES': 100,
+    },
+    # Slow query log (social.middleware.SlowQueryMiddleware), summed up by `manage.py slow_queries`.
+    # Queries slower than the threshold (in seconds) are logged, and a sample of them explained.
+    'SLOW_QUERIES': {
+        'THRESHOLD': 0.1,
+        'EXPLAIN_SAMPLE_RATE': 0.1,
+        'EXPLAIN_ANALYZE': False,
+        'LOG': os.path.join(BASE_DIR, 'slow_queries.jsonl'),
+    },
+    # Read-through cache of the post and user details (social.object_cache)
+    'OBJECT_CACHE': {
+        'CACHE': 'objects',
+        'TIMEOUT': 300,
+        'LOCK_TIMEOUT': 5,
+    },
+    # Rates for the token bucket throttle (social.throttling), keyed by the scopes the viewsets assign to actions.
+    # The number is the bucket size (allowed burst), and the bucket refills at that many requests per period. Each
+    # can be overridden with DJANGO_THROTTLE_<SCOPE> (e.g. DJANGO_THROTTLE_USER_CREATE=10000/min), `off` turns the
+    # scope off; load runs (the bot) sign everyone up from a single IP.
+    'DEFAULT_THROTTLE_RATES': {
+        'user-create': throttle_rate('user-create', '60/min'),
+        'post-create': throttle_rate('post-create', '60/min'),
+        'post-like': throttle_rate('post-like', '120/min'),
+    },
+    # Cache alias holding the throttle buckets
+    'THROTTLE_CACHE': 'throttle',
 }
 
 # Clearbit API key
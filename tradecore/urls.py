@@ -14,7 +14,7 @@ Including another URLconf
     2. Add a URL to urlpatterns:  url(r'^blog/', include('blog.urls'))
 """
 from django.conf.urls import url, include
-from django.contrib import admin
+from django.urls import RegexURLResolver
 from rest_framework import routers
 from rest_framework_jwt.views import obtain_jwt_token
 
@@ -30,9 +30,12 @@ router.register(r'user', views.UserViewSet, base_name='user')
 router.register(r'userprofile', views.UserProfileViewSet, base_name='userprofile')
 router.register(r'post', views.PostViewSet, base_name='post')
 router.register(r'like', views.LikeViewSet, base_name='like')
+router.register(r'export', views.ExportViewSet, base_name='export')
 
 urlpatterns = [
-    url(r'^admin/', admin.site.urls),
+    # NOTE: Unlike include(), a resolver given the module's name only imports it once it's resolved against, keeping
+    #       the admin (and its autodiscovery) off the startup of every worker.
+    RegexURLResolver(r'^admin/', 'tradecore.admin_urls', app_name='admin', namespace='admin'),
     url(r'^api/v1/login/', obtain_jwt_token),
     url(r'^api/v1/', include(router.urls)),
     url(r'^api-docs/', include('rest_framework.urls', namespace='rest_framework'))
@@ -0,0 +1,130 @@
+"""
+Worker warm-up.
+
+Everything the first request on a fresh worker would otherwise pay for: importing the views and their dependencies
+(rest framework, the renderers, the JWT stack), compiling the url patterns, building the serializer fields, opening
+the database connection, and a first pass through the middleware and rendering.
+
+Called by tradecore.wsgi once the application is loaded, unless `WARM_UP` is off. Servers that fork their workers
+after loading the application (e.g. gunicorn --preload) would share the connection opened here between the workers:
+turn `WARM_UP` off and call `warm_up()` from the server's post-fork hook instead.
+
+Connections are per thread, only a worker serving its requests from the thread that loaded it (e.g. a sync gunicorn
+worker) keeps the warm connection, the others open theirs on their first request. Either way, connections are only
+kept between requests with `CONN_MAX_AGE` set.
+"""
+
+import collections
+import io
+import logging
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.urls import get_resolver
+from rest_framework.renderers import JSONRenderer
+
+logger = logging.getLogger(__name__)
+
+# requested once, to go through the middleware, content negotiation and rendering; doesn't touch the database
+WARM_UP_PATH = '/api/v1/'
+
+
+def compile_urls():
+    """
+    Imports the url configuration, and with it the views, and compiles the patterns of all the resolvers that don't
+    load lazily (see tradecore.urls).
+    """
+    resolver = get_resolver()
+    # populated recursively, which compiles every pattern on the way
+    resolver.reverse_dict  # pylint: disable=pointless-statement
+
+    from tradecore.urls import router
+
+    return router
+
+
+def build_serializers(router):
+    """
+    Model serializers build their fields out of the models' meta on first use.
+    """
+    for _, viewset, _ in router.registry:
+        serializer_class = getattr(viewset, 'serializer_class', None)
+
+        if serializer_class is not None:
+            serializer_class().fields  # pylint: disable=expression-not-assigned
+
+    JSONRenderer().render({'warm': True})
+
+
+def connect():
+    for connection in connections.all():
+        connection.ensure_connection()
+
+
+def request(application, path=WARM_UP_PATH):
+    """
+    Makes a request to the application as the server would, with the host the server is meant to be reached on.
+    Returns the response status.
+    """
+    hosts = [host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*']
+
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path.split('?', 1)[0],
+        'QUERY_STRING': path.split('?', 1)[1] if '?' in path else '',
+        'SERVER_NAME': hosts[0] if hosts else 'localhost',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_ACCEPT': 'application/json',
+        'REMOTE_ADDR': '127.0.0.1',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': io.StringIO(),
+        'wsgi.multithread': False,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+
+    status = []
+    result = application(environ, lambda response_status, headers, exc_info=None: status.append(response_status))
+
+    try:
+        b''.join(result)
+    finally:
+        result.close()
+
+    return status[0]
+
+
+def warm_up(application):
+    """
+    Warms the worker up, returning how long each step took, in seconds.
+
+    A failing step (e.g. the database being down at boot) is logged and ends the warm-up, the worker starts serving
+    all the same, the requests only fail as long as the cause lasts.
+    """
+    timings = collections.OrderedDict()
+
+    try:
+        start = time.perf_counter()
+        router = compile_urls()
+        timings['urls'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        build_serializers(router)
+        timings['serializers'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        request(application)
+        timings['request'] = time.perf_counter() - start
+
+        # the request is over, which closes the connections that aren't kept around
+        start = time.perf_counter()
+        connect()
+        timings['connect'] = time.perf_counter() - start
+    except Exception:  # pylint: disable=broad-except
+        logger.exception('Warm-up failed, the worker starts cold.')
+
+    return timings